@@ -0,0 +1,63 @@
+"""Add user_stats rollup and games history index
+
+Revision ID: c7d2e5f81a96
+Revises: b3c41d9e7a52
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e5f81a96'
+down_revision: Union[str, Sequence[str], None] = 'b3c41d9e7a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('races_played', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('total_score', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('best_score', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('multiplayer_played', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('multiplayer_wins', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_played_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_games_user_finished_at_id', 'games', ['user_id', 'finished_at', 'id'])
+
+    # Backfill from existing games. Same rules as the incremental update in submit_score:
+    # a game counts once it has an accepted (non-quarantined, positive) score, and the
+    # highest accepted score in a multiplayer race wins (earliest finisher on ties).
+    # Single player races have a session too (max_players = 1); they don't count as multiplayer.
+    op.execute("""
+        INSERT INTO user_stats (user_id, races_played, total_score, best_score, multiplayer_played, multiplayer_wins, last_played_at)
+        SELECT
+            user_id,
+            count(*),
+            sum(score),
+            max(score),
+            count(*) FILTER (WHERE multiplayer),
+            count(*) FILTER (WHERE multiplayer AND race_rank = 1),
+            max(finished_at)
+        FROM (
+            SELECT g.user_id, g.score, g.finished_at, COALESCE(s.max_players > 1, false) AS multiplayer,
+                   row_number() OVER (PARTITION BY g.race_id ORDER BY g.score DESC, g.finished_at, g.id) AS race_rank
+            FROM games g
+            LEFT JOIN multiplayer_sessions s ON s.id = g.multiplayer_session_id
+            WHERE g.score > 0 AND NOT g.quarantined AND g.user_id IS NOT NULL
+        ) accepted
+        GROUP BY user_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_games_user_finished_at_id', table_name='games')
+    op.drop_table('user_stats')
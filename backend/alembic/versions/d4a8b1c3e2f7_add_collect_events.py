@@ -0,0 +1,37 @@
+"""Add collect_events for idempotent date collection
+
+Revision ID: d4a8b1c3e2f7
+Revises: c7d2e5f81a96
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8b1c3e2f7'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e5f81a96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'collect_events',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('event_id', sa.String(length=64), primary_key=True),
+        sa.Column('challenge_date', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('collected_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(op.f('ix_collect_events_challenge_date'), 'collect_events', ['challenge_date'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_collect_events_challenge_date'), table_name='collect_events')
+    op.drop_table('collect_events')
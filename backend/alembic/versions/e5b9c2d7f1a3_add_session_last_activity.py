@@ -0,0 +1,29 @@
+"""Add last_activity_at to multiplayer_sessions
+
+Revision ID: e5b9c2d7f1a3
+Revises: d4a8b1c3e2f7
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9c2d7f1a3'
+down_revision: Union[str, Sequence[str], None] = 'd4a8b1c3e2f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('multiplayer_sessions', sa.Column('last_activity_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+    op.execute("UPDATE multiplayer_sessions SET last_activity_at = created_at")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('multiplayer_sessions', 'last_activity_at')
@@ -0,0 +1,33 @@
+"""Leave games.finished_at NULL until a score is submitted
+
+Revision ID: f1c3a5e7b9d2
+Revises: e5b9c2d7f1a3
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3a5e7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'e5b9c2d7f1a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Games are created when a player joins, so the default stamped lobbies that never started
+    # and races that were abandoned as finished. submit_score sets it instead.
+    op.alter_column('games', 'finished_at', server_default=None)
+    # Existing rows: never raced, or never submitted a score (indistinguishable from a 0 score,
+    # which doesn't count towards user_stats either)
+    op.execute("UPDATE games SET finished_at = NULL WHERE race_id IS NULL OR COALESCE(score, 0) = 0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('games', 'finished_at', server_default=sa.text('now()'))
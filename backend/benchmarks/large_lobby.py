@@ -0,0 +1,80 @@
+"""
+Large-lobby fan-out benchmark.
+
+Simulates N players in one large-lobby session, each sending moves at a fixed rate,
+and reports outbound frames per player per second. With interest management the
+per-player rate should stay roughly flat as N grows (bounded by LARGE_LOBBY_MAX_NEIGHBOURS
+plus the summary rate) instead of growing linearly with N.
+
+Usage (from backend/):
+    python -m benchmarks.large_lobby [--seconds 3] [--move-rate 10] [--sizes 10,25,50,100]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.websocket_manager import ConnectionManager
+
+class CountingSocket:
+    def __init__(self):
+        self.sent = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.sent += 1
+        self.bytes += len(data)
+
+async def run(players: int, seconds: float, move_rate: float, large: bool) -> dict:
+    manager = ConnectionManager()
+    session_id = f"bench-{players}"
+    sockets = [CountingSocket() for _ in range(players)]
+    for user_id, socket in enumerate(sockets, start=1):
+        await manager.connect(socket, session_id, user_id)
+    manager.set_large(session_id, large)
+
+    # Field spreads out over the race: everyone runs at a slightly different speed
+    speeds = [20 + random.random() * 10 for _ in range(players)]
+    start = time.monotonic()
+    interval = 1 / move_rate
+    while time.monotonic() - start < seconds:
+        elapsed = time.monotonic() - start
+        for user_id, socket in enumerate(sockets, start=1):
+            await manager.broadcast({
+                "type": "move",
+                "user_id": user_id,
+                "lane": random.randint(0, 4),
+                "distance": round(speeds[user_id - 1] * elapsed + user_id * 5, 1)
+            }, session_id, exclude=socket)
+        await asyncio.sleep(interval)
+
+    manager.set_large(session_id, False)
+    duration = time.monotonic() - start
+    return {
+        "frames": sum(s.sent for s in sockets) / players / duration,
+        "bytes": sum(s.bytes for s in sockets) / players / duration
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--move-rate", type=float, default=10.0)
+    parser.add_argument("--sizes", default="10,25,50,100")
+    args = parser.parse_args()
+
+    print(f"{'players':>8} {'mode':>6} {'frames/s/player':>16} {'KB/s/player':>12}")
+    for players in [int(n) for n in args.sizes.split(",")]:
+        for large in (False, True):
+            result = await run(players, args.seconds, args.move_rate, large)
+            mode = "large" if large else "full"
+            print(f"{players:>8} {mode:>6} {result['frames']:>16.1f} {result['bytes'] / 1024:>12.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
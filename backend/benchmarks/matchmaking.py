@@ -0,0 +1,80 @@
+"""
+Matchmaking load harness.
+
+Feeds synthetic players into the matchmaking queue at a fixed arrival rate and runs the
+real matcher (including the bulk lobby transaction) against DATABASE_URL, then reports
+matching throughput and time-to-match percentiles from Matchmaker.stats().
+
+Usage (from backend/, against a scratch database):
+    DATABASE_URL=sqlite:////tmp/matchmaking.db python -m benchmarks.matchmaking --create-tables
+    python -m benchmarks.matchmaking --players 5000 --rate 500 --sizes 2,5,10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import models
+from database.database import Base, SessionLocal, engine
+from libs.matchmaking import Matchmaker, Ticket
+from libs.settings import settings
+
+def create_users(count: int) -> list:
+    db = SessionLocal()
+    try:
+        run = uuid.uuid4().hex[:8]
+        users = [
+            models.User(oauth_id=f"bench-{run}-{i}", email=f"bench-{run}-{i}@example.com", username=f"bench{i}", is_guest=True)
+            for i in range(count)
+        ]
+        db.add_all(users)
+        db.commit()
+        return [(u.id, u.username) for u in users]
+    finally:
+        db.close()
+
+async def run(players: int, rate: float, sizes: list) -> dict:
+    users = create_users(players)
+    matcher = Matchmaker()
+    started = time.monotonic()
+    arrived = 0
+
+    while True:
+        # Arrivals since the last pass
+        due = min(players, int((time.monotonic() - started) * rate))
+        for user_id, username in users[arrived:due]:
+            matcher.enqueue(Ticket(user_id=user_id, username=username, max_players=random.choice(sizes)))
+        arrived = due
+        await matcher.run_once()
+        # Done once the leftovers are too few to ever form a lobby
+        if arrived == players and all(
+            len(queue) < min(settings.MATCHMAKING_MIN_PLAYERS, size) for size, queue in matcher.queues.items()
+        ):
+            break
+        await asyncio.sleep(settings.MATCHMAKING_INTERVAL)
+
+    duration = time.monotonic() - started
+    return {"duration": duration, "throughput": matcher.matched / duration, **matcher.stats()}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200, help="arrivals per second")
+    parser.add_argument("--sizes", default="2,5", help="lobby sizes players ask for")
+    parser.add_argument("--create-tables", action="store_true", help="create tables first (scratch databases only)")
+    args = parser.parse_args()
+
+    if args.create_tables:
+        Base.metadata.create_all(bind=engine)
+
+    result = asyncio.run(run(args.players, args.rate, [int(s) for s in args.sizes.split(",")]))
+    for key, value in result.items():
+        print(f"{key:>20}: {round(value, 3) if isinstance(value, float) else value}")
+
+if __name__ == "__main__":
+    main()
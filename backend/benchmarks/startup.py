@@ -0,0 +1,92 @@
+"""
+Startup benchmark: how fast a fresh replica becomes healthy.
+
+Reports, each in a fresh interpreter:
+- import time of `main` (median of --runs) and the slowest top-level imports
+- time from process spawn until GET /health answers (uvicorn on --port)
+- with --migrations: `python -m libs.migrations` vs `alembic upgrade head` against DATABASE_URL
+
+Usage (from backend/):
+    python -m benchmarks.startup [--runs 5] [--port 8765] [--migrations]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(args: list) -> subprocess.CompletedProcess:
+    return subprocess.run(args, cwd=BACKEND_DIR, capture_output=True, text=True)
+
+def import_time() -> float:
+    result = run([sys.executable, "-c", "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(limit: int = 10) -> list:
+    """(cumulative ms, module) of main's direct imports, from -X importtime."""
+    result = run([sys.executable, "-X", "importtime", "-c", "import main"])
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", line)
+        # Two spaces of indent = imported directly by main (or by the interpreter)
+        if match and len(match.group(2)) <= 3 and match.group(3) != "main":
+            rows.append((int(match.group(1)) / 1000, match.group(3)))
+    return sorted(rows, reverse=True)[:limit]
+
+def time_to_healthy(port: int, timeout: float = 30) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("server did not become healthy")
+    finally:
+        process.terminate()
+        process.wait()
+
+def timed(args: list, ok_codes=(0,)) -> float:
+    started = time.perf_counter()
+    result = run(args)
+    elapsed = time.perf_counter() - started
+    return elapsed if result.returncode in ok_codes else float("nan")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--migrations", action="store_true")
+    args = parser.parse_args()
+
+    times = [import_time() for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(times) * 1000:.0f}ms (min {min(times) * 1000:.0f}ms, {args.runs} runs)")
+    for ms, module in slowest_imports():
+        print(f"  {ms:8.1f}ms  {module}")
+
+    try:
+        print(f"time to healthy: {time_to_healthy(args.port) * 1000:.0f}ms")
+    except Exception as e:
+        print(f"time to healthy: skipped ({e})")
+
+    if args.migrations:
+        print(f"migration check (libs.migrations): {timed([sys.executable, '-m', 'libs.migrations'], ok_codes=(0, 1)) * 1000:.0f}ms")
+        print(f"alembic upgrade head: {timed([sys.executable, '-m', 'alembic', 'upgrade', 'head']) * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,94 @@
-from sqlalchemy import create_engine
+import time
+import threading
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from libs.settings import settings
+from libs.logger import get_logger
+from libs.profiling import instrument_engine
+
+logger = get_logger(__name__)
 
 # Default to a local postgres if not set. Change as needed.
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
+def _pool_options(url: str) -> dict:
+    # Sized explicitly: admission control sheds load on pool usage (sqlite keeps its default pool)
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
+    SQLALCHEMY_DATABASE_URL,
+    **_pool_options(SQLALCHEMY_DATABASE_URL)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica. Read-only routes use get_read_db, which falls back
+# to the primary when no replica is configured or it lags too far behind.
+read_engine = create_engine(settings.READ_DATABASE_URL, **_pool_options(settings.READ_DATABASE_URL)) if settings.READ_DATABASE_URL else None
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else None
+
+# Query time shows up as `db` in Server-Timing (when enabled)
+instrument_engine(engine)
+if read_engine:
+    instrument_engine(read_engine)
+
 Base = declarative_base()
 
+# Zero lag when caught up with what was received (an idle primary would otherwise look stale)
+REPLICA_LAG_SQL = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+_replica_lock = threading.Lock()
+_replica_usable = False
+_replica_checked_at = 0.0
+
+def replica_is_usable() -> bool:
+    """
+    Returns True if the replica is within READ_REPLICA_MAX_LAG_SECONDS.
+    The lag query runs at most once per READ_REPLICA_LAG_CHECK_INTERVAL.
+    """
+    global _replica_usable, _replica_checked_at
+    if read_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - _replica_checked_at < settings.READ_REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_usable
+
+    with _replica_lock:
+        # Another caller may have refreshed it while we waited
+        if now - _replica_checked_at < settings.READ_REPLICA_LAG_CHECK_INTERVAL:
+            return _replica_usable
+        try:
+            with read_engine.connect() as conn:
+                lag = float(conn.execute(REPLICA_LAG_SQL).scalar() or 0)
+            usable = lag <= settings.READ_REPLICA_MAX_LAG_SECONDS
+            if not usable:
+                logger.warning(f"Read replica lag {lag:.1f}s exceeds tolerance, reading from primary")
+        except Exception as e:
+            logger.error(f"Read replica unavailable, reading from primary: {e}")
+            usable = False
+        _replica_usable = usable
+        _replica_checked_at = time.monotonic()
+        return usable
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    db = ReadSessionLocal() if replica_is_usable() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
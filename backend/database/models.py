@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -47,6 +47,8 @@ class MultiplayerSession(Base):
     
     status = Column(String, default="waiting") # waiting, started, finished
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped on joins and, while anyone is connected, by each worker's lobby reaper
+    last_activity_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # race = relationship("Race", back_populates="sessions") # Removed
     host = relationship("User", back_populates="hosted_sessions")
@@ -62,8 +64,36 @@ class Game(Base):
     car_index = Column(Integer, default=0)
     assigned_lane = Column(Integer, nullable=True)
     score = Column(Integer, default=0)
-    finished_at = Column(DateTime(timezone=True), server_default=func.now())
+    quarantined = Column(Boolean, default=False) # Score failed the plausibility check; kept off leaderboards
+    finished_at = Column(DateTime(timezone=True), nullable=True) # set by submit_score; NULL while unfinished
 
     user = relationship("User", back_populates="games")
     session = relationship("MultiplayerSession", back_populates="games")
     race = relationship("Race") # Add relationship
+
+    __table_args__ = (
+        # Keyset pagination of a user's history (/game/history)
+        Index("ix_games_user_finished_at_id", "user_id", "finished_at", "id"),
+    )
+
+class UserStats(Base):
+    """Per-user rollup maintained by submit_score (libs.scores.SUBMIT_SCORE_SQL), so profiles never scan games."""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    races_played = Column(Integer, default=0, nullable=False)
+    total_score = Column(BigInteger, default=0, nullable=False) # for the average
+    best_score = Column(Integer, default=0, nullable=False)
+    multiplayer_played = Column(Integer, default=0, nullable=False)
+    multiplayer_wins = Column(Integer, default=0, nullable=False)
+    last_played_at = Column(DateTime(timezone=True), nullable=True)
+
+class CollectEvent(Base):
+    """Applied /challenge/collect events by client event id, so retries are only counted once. Pruned at the daily reset."""
+    __tablename__ = "collect_events"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    event_id = Column(String(64), primary_key=True)
+    challenge_date = Column(String, nullable=False, index=True)
+    count = Column(Integer, nullable=False)
+    collected_at = Column(DateTime(timezone=True), nullable=False) # client timestamp
@@ -3,8 +3,14 @@
 # Exit immediately if a command exits with a non-zero status
 set -e
 
-echo "Running database migrations..."
-alembic upgrade head
+# Skip the (slow) alembic run when the database is already at head.
+# Set FORCE_MIGRATIONS=true to always run it.
+if [ "$FORCE_MIGRATIONS" != "true" ] && python -m libs.migrations; then
+    echo "Database already at head, skipping migrations"
+else
+    echo "Running database migrations..."
+    alembic upgrade head
+fi
 
 echo "Starting the application..."
 exec python main.py
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from libs.logger import get_logger
+from libs.settings import settings
+
+logger = get_logger(__name__)
+
+def _parse_route_limits(spec: str) -> Dict[Tuple[str, str], int]:
+    """"POST /api/game/lobby=50,POST /api/auth/guest=50" -> {("POST", "/api/game/lobby"): 50, ...}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, limit = item.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        limits[(method.upper(), path.strip())] = int(limit)
+    return limits
+
+class AdmissionController:
+    """
+    Fails fast instead of letting every request slow down together under a spike.
+    A request is shed (503 + Retry-After, or WebSocket close 1013 with a retry hint) when:
+    - the global or per-route in-flight limit is reached
+    - the DB connection pool is nearly exhausted
+    - event loop lag is above ADMISSION_MAX_LOOP_LAG
+    Every decision is counted for /health/admission.
+    """
+
+    def __init__(self):
+        self.route_limits = _parse_route_limits(settings.ADMISSION_ROUTE_LIMITS)
+        self.in_flight = 0
+        self.route_in_flight: Counter = Counter()
+        self.loop_lag = 0.0
+        self.admitted = 0
+        # (reason, route) -> count
+        self.shed: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._measure_loop_lag())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _measure_loop_lag(self):
+        interval = settings.ADMISSION_LAG_CHECK_INTERVAL
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            # How late the loop woke us up
+            self.loop_lag = max(0.0, time.perf_counter() - started - interval)
+
+    def db_pool_usage(self) -> float:
+        """Checked out connections / pool capacity (0 for pools without a fixed size, e.g. sqlite)."""
+        from database.database import engine
+        pool = engine.pool
+        if not hasattr(pool, "checkedout") or not hasattr(pool, "size"):
+            return 0.0
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        return pool.checkedout() / capacity if capacity > 0 else 0.0
+
+    def overloaded(self) -> Optional[str]:
+        """Reason the server is too busy to take on new work, or None."""
+        if self.loop_lag > settings.ADMISSION_MAX_LOOP_LAG:
+            return "loop_lag"
+        if self.db_pool_usage() >= settings.ADMISSION_MAX_DB_POOL_USAGE:
+            return "db_pool"
+        return None
+
+    def try_acquire(self, method: str, path: str) -> Optional[str]:
+        """Admits an HTTP request (caller must release()) or returns the reason it was shed."""
+        route = (method, path)
+        reason = self.overloaded()
+        if reason is None and self.in_flight >= settings.ADMISSION_MAX_CONCURRENT:
+            reason = "concurrency"
+        if reason is None and route in self.route_limits and self.route_in_flight[route] >= self.route_limits[route]:
+            reason = "route_concurrency"
+        if reason:
+            self.shed[(reason, f"{method} {path}")] += 1
+            return reason
+        self.in_flight += 1
+        if route in self.route_limits:
+            self.route_in_flight[route] += 1
+        self.admitted += 1
+        return None
+
+    def release(self, method: str, path: str):
+        self.in_flight -= 1
+        if (method, path) in self.route_limits:
+            self.route_in_flight[(method, path)] -= 1
+
+    def admit_websocket(self, route: str, new_session: bool = False, rejoin: bool = False) -> Optional[str]:
+        """
+        Reason to turn away a new WebSocket (counted), or None to admit it.
+        While draining only players rejoining a session that is live here (rejoin) get in.
+        """
+        from libs.drain import drainer
+        from libs.websocket_manager import manager
+        reason = "draining" if drainer.draining and not rejoin else self.overloaded()
+        if reason is None and new_session and len(manager.active_connections) >= settings.WS_MAX_ACTIVE_SESSIONS:
+            reason = "max_sessions"
+        if reason:
+            self.shed[(reason, route)] += 1
+            return reason
+        self.admitted += 1
+        return None
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "db_pool_usage": round(self.db_pool_usage(), 3),
+            "shed": [
+                {"reason": reason, "route": route, "count": count}
+                for (reason, route), count in self.shed.most_common()
+            ]
+        }
+
+controller = AdmissionController()
+
+async def reject_websocket(websocket, reason: str):
+    """Close-with-retry-hint: clients should reconnect after ADMISSION_RETRY_AFTER seconds."""
+    await websocket.accept()
+    await websocket.close(code=1013, reason=f"Server busy ({reason}), retry_after={settings.ADMISSION_RETRY_AFTER}")
+
+class AdmissionMiddleware:
+    """Plain ASGI middleware (no per-request task/body wrapping) applying the controller to HTTP requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in settings.ADMISSION_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        reason = controller.try_acquire(method, path)
+        if reason:
+            body = json.dumps({"detail": "Server busy, please retry", "reason": reason}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(settings.ADMISSION_RETRY_AFTER).encode()),
+                    (b"content-length", str(len(body)).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(method, path)
@@ -1,23 +1,30 @@
 import time
 import threading
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database import models
 from database.database import SessionLocal
-from libs import daily_challenge
-import traceback
+from libs import daily_challenge, scores, replay
+from libs.settings import settings
+from libs.websocket_manager import manager
+from libs.logger import get_logger
+
+logger = get_logger(__name__)
 
 def monitor_loop():
     """
     Background thread loop.
-    Checks user scores periodically and resets them if they failed the daily challenge.
-    Also handles Daily Reset at 00:00.
+    Handles Daily Reset at 00:00, and materializes daily challenge penalties once per
+    check day (at startup and when the window closes). Reads use
+    daily_challenge.effective_score in between, so users don't need rechecking every minute.
     """
-    print("Background Challenge Monitor: Started")
+    logger.info("Background Challenge Monitor: Started")
     
     # Initialize last checked date
     # Maldives is UTC+5
     from datetime import datetime, timedelta
     last_checked_date = (datetime.utcnow() + timedelta(hours=5)).date()
+    last_penalty_date = None
     
     while True:
         try:
@@ -29,20 +36,18 @@ def monitor_loop():
                 current_date = now_maldives.date()
                 
                 if current_date > last_checked_date:
-                    print(f"Background Monitor: New Day Detected ({current_date}). Triggering reset...")
+                    logger.info(f"Background Monitor: New Day Detected ({current_date}). Triggering reset...")
                     daily_challenge.reset_daily_collection(db)
                     last_checked_date = current_date
                 
-                # 2. Penalty Check (Existing Logic)
-                # Query all users with a score > 0
-                users = db.query(models.User).filter(models.User.score > 0).all()
-                
-                for user in users:
-                    daily_challenge.check_and_apply_penalty(db, user)
+                # 2. Penalty Check: one bulk update whenever the day being judged changes
+                check_date, _ = daily_challenge.penalty_check_dates()
+                if check_date != last_penalty_date:
+                    daily_challenge.apply_penalties(db)
+                    last_penalty_date = check_date
                     
             except Exception as e:
-                print(f"Background Monitor Error: {e}")
-                traceback.print_exc()
+                logger.exception(f"Background Monitor Error: {e}")
             finally:
                 db.close()
                 
@@ -50,10 +55,85 @@ def monitor_loop():
             time.sleep(60)
             
         except Exception as e:
-            print(f"Critical Background Monitor Error: {e}")
+            logger.error(f"Critical Background Monitor Error: {e}")
             time.sleep(60) # Wait and retry
 
 def start_challenge_monitor():
     """Starts the background monitor thread."""
     thread = threading.Thread(target=monitor_loop, daemon=True)
     thread.start()
+
+def touch_lobbies(db: Session, session_ids: list):
+    """Marks waiting lobbies with players connected to this process as active."""
+    if not session_ids:
+        return
+    db.query(models.MultiplayerSession).filter(
+        models.MultiplayerSession.id.in_(session_ids),
+        models.MultiplayerSession.status == "waiting"
+    ).update({models.MultiplayerSession.last_activity_at: func.now()}, synchronize_session=False)
+    db.commit()
+
+def reap_abandoned_lobbies(db: Session) -> int:
+    """Closes lobbies still waiting with no activity for LOBBY_IDLE_TIMEOUT."""
+    from datetime import datetime, timedelta, timezone
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.LOBBY_IDLE_TIMEOUT)
+    reaped = db.query(models.MultiplayerSession).filter(
+        models.MultiplayerSession.status == "waiting",
+        func.coalesce(models.MultiplayerSession.last_activity_at, models.MultiplayerSession.created_at) < cutoff
+    ).update({models.MultiplayerSession.status: "abandoned"}, synchronize_session=False)
+    db.commit()
+    return reaped
+
+def lobby_reaper_loop():
+    """
+    Background thread loop. Periodically closes abandoned lobbies and prunes old replay logs.
+    Liveness is kept on the session row, not in this process's sockets: every worker
+    touches the lobbies it holds connections for before reaping, so with several
+    workers a lobby connected elsewhere still counts as active (as long as
+    LOBBY_REAPER_INTERVAL is well below LOBBY_IDLE_TIMEOUT).
+    """
+    while True:
+        time.sleep(settings.LOBBY_REAPER_INTERVAL)
+        db: Session = SessionLocal()
+        try:
+            touch_lobbies(db, [int(s) for s in list(manager.active_connections.keys()) if s.isdigit()])
+            reaped = reap_abandoned_lobbies(db)
+            if reaped:
+                logger.info(f"Lobby Reaper: Closed {reaped} abandoned lobbies")
+        except Exception as e:
+            logger.exception(f"Lobby Reaper Error: {e}")
+        finally:
+            db.close()
+        try:
+            removed, freed = replay.prune_replays()
+            if removed:
+                logger.info(f"Lobby Reaper: Pruned {removed} replay logs ({freed // (1024 * 1024)} MB)")
+        except Exception as e:
+            logger.exception(f"Replay Prune Error: {e}")
+
+def start_lobby_reaper():
+    """Starts the abandoned lobby reaper thread."""
+    thread = threading.Thread(target=lobby_reaper_loop, daemon=True)
+    thread.start()
+
+def leaderboard_reload_loop():
+    """
+    Background thread loop. Rebuilds the in-memory global and daily leaderboards from the DB.
+    Boards are per process, so this is how scores and dates submitted on other instances arrive.
+    An update published while a reload's query runs can be overwritten by it; the next reload restores it.
+    """
+    while True:
+        time.sleep(settings.LEADERBOARD_RELOAD_INTERVAL)
+        db: Session = SessionLocal()
+        try:
+            scores.load_leaderboard(db)
+            daily_challenge.load_daily_leaderboard(db)
+        except Exception as e:
+            logger.exception(f"Leaderboard Reload Error: {e}")
+        finally:
+            db.close()
+
+def start_leaderboard_reloader():
+    """Starts the leaderboard reload thread."""
+    thread = threading.Thread(target=leaderboard_reload_loop, daemon=True)
+    thread.start()
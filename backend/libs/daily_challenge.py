@@ -1,22 +1,42 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import random
+import uuid
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from database import models
 from libs.settings import settings
+from libs.leaderboard_feed import feed
+from libs.scores import publish_high_score
+from libs.rank_index import RankIndex
+from libs.logger import get_logger
+
+logger = get_logger(__name__)
 
 # Challenge Window: Configurable
 CHALLENGE_START_HOUR = settings.DATES_START_HOUR
 CHALLENGE_END_HOUR = settings.DATES_END_HOUR
 
-def get_today_challenge_date() -> str | None:
-    """Returns YYYY-MM-DD if current time is within 05:00 - 18:00 window."""
+# In-memory daily leaderboard (dates collected), updated in place by collect_dates.
+# Per process: rebuilt from the users rows COLLECT_DATES_SQL maintains at startup, whenever
+# the leaderboard day changes, and every LEADERBOARD_RELOAD_INTERVAL (libs.background_tasks),
+# which brings in dates collected through other instances.
+_daily_board = RankIndex()
+_daily_board_date: str | None = None
+
+def get_today_challenge_date(at: datetime | None = None) -> str | None:
+    """Returns YYYY-MM-DD if current time (or `at`, naive UTC) is within 05:00 - 18:00 window."""
     # Maldives is UTC+5
-    now = datetime.utcnow() + timedelta(hours=5)
+    now = (at or datetime.utcnow()) + timedelta(hours=5)
     if CHALLENGE_START_HOUR <= now.hour < CHALLENGE_END_HOUR:
         return now.strftime("%Y-%m-%d")
     return None
 
-from libs.settings import settings
+@lru_cache(maxsize=64)
+def _base_target(date_str: str) -> int:
+    # Same for every user on a given date
+    rng = random.Random(f"daily_dates_{date_str}")
+    return rng.randint(settings.DATES_MIN_TARGET, settings.DATES_MAX_TARGET)
 
 def get_daily_target(date_str: str, user_score: int = 0) -> int:
     """
@@ -24,107 +44,188 @@ def get_daily_target(date_str: str, user_score: int = 0) -> int:
     Base target is random between MIN and MAX.
     Difficulty modifier: +1 target for every 5000 points of score.
     """
-    seed = f"daily_dates_{date_str}"
-    rng = random.Random(seed)
-    
-    base_target = rng.randint(settings.DATES_MIN_TARGET, settings.DATES_MAX_TARGET)
-    
-    # Scale based on score (Higher score = Harder challenge)
-    # Example: 10,000 score -> +2 dates
-    difficulty_mod = user_score // 5000
-    
-    final_target = base_target + difficulty_mod
-    
-    # Optional: Cap it at some reasonable upper limit if needed, or let it grow indefinitely?
-    # User asked for "random amount ... each user gets different amounts ... higher score more they have to collect"
     # The RNG seed is date-based, so all users get same BASE target.
     # But difficulty_mod makes it different per user.
-    
-    return final_target
+    # Example: 10,000 score -> +2 dates
+    difficulty_mod = (user_score or 0) // 5000
+    return _base_target(date_str) + difficulty_mod
 
-def check_and_apply_penalty(db: Session, user: models.User):
+def penalty_check_dates() -> tuple[str, str]:
     """
-    Checks if user failed the previous valid challenge day.
-    If so, resets score to 0.
-    Should be called on login/session validation.
+    (check_date, today): the last challenge day whose result is final, and today's date.
+    Before the window opens and while it is open, that's yesterday; once it closes, today.
     """
     # Maldives is UTC+5
     now = datetime.utcnow() + timedelta(hours=5)
-    
-    # Determine the 'last completed challenge day' that implies a check
-    # If now < 5AM, then yesterday's window is closed and should be checked.
-    # If now >= 18PM, then today's window is closed and should be checked.
-    # If now is inside window, we can't check TODAY yet, but we must have passed YESTERDAY.
-    
-    if now.hour < CHALLENGE_START_HOUR:
-        # Before window opens, verify yesterday
-        check_date = (now - timedelta(days=1)).strftime("%Y-%m-%d")
-    elif now.hour >= CHALLENGE_END_HOUR:
-        # After window closes, verify today
-        check_date = now.strftime("%Y-%m-%d")
-    else:
-        # During window, verify yesterday (since today is still ongoing)
-        check_date = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+    today_str = now.strftime("%Y-%m-%d")
+    if now.hour >= CHALLENGE_END_HOUR:
+        return today_str, today_str
+    return (now - timedelta(days=1)).strftime("%Y-%m-%d"), today_str
 
+@lru_cache(maxsize=65536)
+def effective_score(score: int, last_challenge_date: str | None, dates_collected_today: int, check_date: str, today: str) -> int:
+    """
+    The score a user actually holds once the daily penalty is taken into account:
+    0 if they missed or failed check_date, otherwise the stored score.
+    Pure, so reads never have to write; the stored score is zeroed lazily.
+    """
     # If user has no history, new user, no penalty.
-    if not user.last_challenge_date:
-        return
-
-    # If user's last attempt is strictly older than check_date, they missed the check_date entirely.
-    if user.last_challenge_date < check_date:
-        reset_score(db, user)
-        # Advance last_challenge_date to prevent repeated resets for the same miss?
-        # Actually, if they log in multiple times, we don't want to keep resetting if they score 0.
-        # But score becomes 0, so resetting 0 to 0 is fine.
-        return
-
-    # If user played on check_date, did they meet the target?
-    # If user played on check_date, did they meet the target?
-    if user.last_challenge_date == check_date:
-        today_str = now.strftime("%Y-%m-%d")
-        
-        # Only check if data is reliable:
-        # 1. Checking TODAY (Window closed evening check) -> Data intact.
-        # 2. Checking YESTERDAY but dates > 0 -> Server missed midnight wipe, data intact.
-        # If Checking YESTERDAY and dates == 0 -> Assume Midnight Wipe handled it. Skip.
-        
-        should_check = False
-        if check_date == today_str:
-            should_check = True
-        elif user.dates_collected_today > 0:
-            should_check = True
-            
-        if should_check:
-            target = get_daily_target(check_date, user.score)
-            if user.dates_collected_today < target:
-                reset_score(db, user)
-
-def reset_score(db: Session, user: models.User):
-    if user.score > 0:
-        print(f"Applying penalty to {user.username}: Score reset from {user.score} to 0")
+    if not score or not last_challenge_date:
+        return score or 0
+
+    # Last attempt strictly older than check_date: they missed it entirely.
+    if last_challenge_date < check_date:
+        return 0
+
+    # Played on check_date: did they meet the target?
+    # Only if the count is still that day's:
+    # 1. Checking TODAY (window closed evening check) -> data intact.
+    # 2. Checking YESTERDAY but dates > 0 -> midnight wipe hasn't run yet, data intact.
+    # Checking YESTERDAY with dates == 0 -> the midnight reset already judged it.
+    if last_challenge_date == check_date and (check_date == today or dates_collected_today > 0):
+        if dates_collected_today < get_daily_target(check_date, score):
+            return 0
+    return score
+
+def effective_user_score(user: models.User) -> int:
+    return effective_score(user.score or 0, user.last_challenge_date, user.dates_collected_today or 0, *penalty_check_dates())
+
+def apply_pending_penalty(user: models.User) -> bool:
+    """
+    Materializes the penalty on a row that is about to be written anyway.
+    Returns True if the score was zeroed; the caller commits and publishes the 0.
+    """
+    if user.score and effective_user_score(user) == 0:
+        logger.info(f"Applying penalty to user {user.id}: Score reset from {user.score} to 0")
         user.score = 0
-        db.commit()
+        return True
+    return False
 
-def increment_dates(db: Session, user: models.User, count: int = 1):
-    """Increments dates collected if window is open."""
+# Zeroes everyone whose result for :check_date is final and failed, in one statement
+# (same rules as effective_score; score / 5000 is integer division).
+APPLY_PENALTIES_SQL = text("""
+UPDATE users
+SET score = 0
+WHERE score > 0
+  AND last_challenge_date IS NOT NULL
+  AND (
+    last_challenge_date < :check_date
+    OR (
+      last_challenge_date = :check_date
+      AND (:check_is_today OR dates_collected_today > 0)
+      AND COALESCE(dates_collected_today, 0) < :base_target + score / 5000
+    )
+  )
+RETURNING id, username, profile_photo
+""")
+
+def apply_penalties(db: Session) -> int:
+    """Daily bulk job: materializes every pending penalty and clears those users from the leaderboard."""
+    check_date, today = penalty_check_dates()
+    rows = db.execute(APPLY_PENALTIES_SQL, {
+        "check_date": check_date,
+        "check_is_today": check_date == today,
+        "base_target": _base_target(check_date),
+    }).all()
+    db.commit()
+    for user_id, username, photo in rows:
+        publish_high_score(user_id, username, 0, photo)
+    if rows:
+        logger.info(f"Penalty check for {check_date}: reset {len(rows)} scores")
+    return len(rows)
+
+# Applies a batch of collect events in one statement: events already recorded for
+# the user (client retries) are skipped by the primary key, and only the newly
+# inserted ones are added to today's count. The users row is updated under its row
+# lock with the latest committed count, so concurrent flushes can't lose increments.
+# :reset_score applies a pending daily challenge penalty in the same write.
+COLLECT_DATES_SQL = text("""
+WITH ins AS (
+    INSERT INTO collect_events (user_id, event_id, challenge_date, count, collected_at)
+    SELECT :user_id, e.event_id, :today, e.count, e.collected_at
+    FROM unnest(CAST(:event_ids AS varchar[]), CAST(:counts AS integer[]), CAST(:collected_at AS timestamptz[]))
+        AS e(event_id, count, collected_at)
+    ON CONFLICT (user_id, event_id) DO NOTHING
+    RETURNING event_id, count
+),
+user_upd AS (
+    UPDATE users
+    SET dates_collected_today = CASE WHEN last_challenge_date = :today THEN COALESCE(dates_collected_today, 0) ELSE 0 END
+            + (SELECT COALESCE(sum(count), 0) FROM ins),
+        last_challenge_date = :today,
+        score = CASE WHEN :reset_score THEN 0 ELSE score END
+    WHERE id = :user_id
+    RETURNING dates_collected_today
+)
+SELECT (SELECT dates_collected_today FROM user_upd), ARRAY(SELECT event_id FROM ins)
+""")
+
+def collect_dates(db: Session, user: models.User, events: list) -> tuple[bool, str | dict]:
+    """
+    Applies collect events of (event_id, count, collected_at) and commits once.
+    Each event must have been collected (client time; naive means UTC) during today's
+    window; others are rejected. Event ids already applied are skipped, so retrying a
+    batch is safe.
+    """
     today = get_today_challenge_date()
     if not today:
         return False, "Challenge window closed (5AM - 6PM)"
 
-    if user.last_challenge_date != today:
-        # Initialize for new day
-        user.dates_collected_today = 0
-        user.last_challenge_date = today
-    
-    user.dates_collected_today += count
-    db.commit()
-    user.dates_collected_today += count
+    latest = datetime.utcnow() + timedelta(seconds=settings.COLLECT_MAX_CLOCK_SKEW)
+    valid = {}
+    rejected = []
+    for event_id, count, collected_at in events:
+        if collected_at.tzinfo is not None:
+            collected_at = collected_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if event_id in valid:
+            continue
+        if collected_at > latest:
+            rejected.append({"id": event_id, "reason": "in_future"})
+        elif get_today_challenge_date(collected_at) != today:
+            rejected.append({"id": event_id, "reason": "outside_window"})
+        else:
+            valid[event_id] = (count, collected_at.replace(tzinfo=timezone.utc))
+
+    if not valid:
+        collected = user.dates_collected_today if user.last_challenge_date == today else 0
+        return True, {"collected": collected or 0, "accepted": [], "duplicates": [], "rejected": rejected}
+
+    # Judged on the previous day's progress, which the update below overwrites
+    penalized = bool(user.score) and effective_user_score(user) == 0
+    collected, inserted = db.execute(COLLECT_DATES_SQL, {
+        "user_id": user.id,
+        "today": today,
+        "event_ids": list(valid),
+        "counts": [count for count, _ in valid.values()],
+        "collected_at": [collected_at for _, collected_at in valid.values()],
+        "reset_score": penalized,
+    }).one()
+    # Captured before commit so publishing doesn't reload the row
+    entry = (user.id, user.username, collected, user.profile_photo)
     db.commit()
-    return True, "Date collected"
+
+    if penalized:
+        logger.info(f"Applying penalty to user {user.id}: Score reset to 0")
+        publish_high_score(entry[0], entry[1], 0, entry[3])
+    if inserted:
+        _get_daily_board(db, today).update(entry[0], entry[2], entry[1], entry[3])
+        feed.publish_dates(*entry)
+    inserted = set(inserted)
+    return True, {
+        "collected": collected,
+        "accepted": [event_id for event_id in valid if event_id in inserted],
+        "duplicates": [event_id for event_id in valid if event_id not in inserted],
+        "rejected": rejected
+    }
+
+def increment_dates(db: Session, user: models.User, count: int = 1):
+    """Increments dates collected if window is open (one event, from the game WebSocket)."""
+    success, result = collect_dates(db, user, [(f"ws-{uuid.uuid4()}", count, datetime.utcnow())])
+    return success, "Date collected" if success else result
 
 def reset_daily_collection(db: Session):
     """Resets dates_collected_today to 0 for ALL users. Called at midnight."""
-    print("Background Monitor: Running daily reset and penalty check...")
+    logger.info("Background Monitor: Running daily reset and penalty check...")
     
     # 1. Identify "Yesterday" (The day that just ended)
     # 1 second ago it was yesterday.
@@ -138,18 +239,32 @@ def reset_daily_collection(db: Session):
         models.User.last_challenge_date == yesterday_str
     ).all()
 
+    reset_users = []
     for user in users_played_yesterday:
         target = get_daily_target(yesterday_str, user.score)
         if user.dates_collected_today < target:
-             print(f"Midnight Check: {user.username} failed challenge ({user.dates_collected_today}/{target}). Resetting score.")
+             logger.info(f"Midnight Check: user {user.id} failed challenge ({user.dates_collected_today}/{target}). Resetting score.")
+             if user.score:
+                 reset_users.append((user.id, user.username, user.profile_photo))
              user.score = 0
     
     db.commit()
 
     # 3. Wipe daily collection for EVERYONE
     db.query(models.User).update({models.User.dates_collected_today: 0})
+    # Only today's event ids can still be retried (older events are outside the window)
+    today_str = now_mvt.strftime("%Y-%m-%d")
+    db.query(models.CollectEvent).filter(models.CollectEvent.challenge_date < today_str).delete(synchronize_session=False)
     db.commit()
 
+    global _daily_board_date
+    _daily_board.clear()
+    _daily_board_date = _leaderboard_date()
+
+    for user_id, username, photo in reset_users:
+        publish_high_score(user_id, username, 0, photo)
+    feed.publish_daily_reset()
+
 def get_status(user: models.User):
     today = get_today_challenge_date()
     
@@ -160,7 +275,7 @@ def get_status(user: models.User):
     collected = 0
     
     if today:
-        target = get_daily_target(today, user.score)
+        target = get_daily_target(today, effective_user_score(user))
         if user.last_challenge_date == today:
             collected = user.dates_collected_today
         else:
@@ -171,14 +286,18 @@ def get_status(user: models.User):
         # For now just inactive.
         active = False
         
+    # Own position on today's board (only if the in-memory board is for today)
+    rank = _daily_board.rank(user.id) if today and _daily_board_date == today else None
+        
     return {
         "active": active,
         "target": target,
         "collected": collected,
+        "rank": rank,
         "window": f"{CHALLENGE_START_HOUR:02d}:00 - {CHALLENGE_END_HOUR:02d}:00"
     }
 
-def get_daily_leaderboard(db: Session, limit: int = 3):
+def _leaderboard_date() -> str:
     today = get_today_challenge_date()
     if not today:
         # If window is closed, show leaderboard for TODAY (results so far)
@@ -189,18 +308,40 @@ def get_daily_leaderboard(db: Session, limit: int = 3):
         # Simple fallback: use current date (even if outside window)
         now = datetime.utcnow() + timedelta(hours=5)
         today = now.strftime("%Y-%m-%d")
-        
-    # Query users who have collected dates today, ordered by count desc
-    results = db.query(models.User).filter(
-        models.User.last_challenge_date == today,
+    return today
+
+def load_daily_leaderboard(db: Session, date_str: str | None = None):
+    """Rebuilds the in-memory daily leaderboard from the DB. Called at startup and by the reloader."""
+    global _daily_board_date
+    date_str = date_str or _leaderboard_date()
+    
+    # Users who have collected dates on that day
+    rows = db.query(
+        models.User.id,
+        models.User.dates_collected_today,
+        models.User.username,
+        models.User.profile_photo
+    ).filter(
+        models.User.last_challenge_date == date_str,
         models.User.dates_collected_today > 0
-    ).order_by(models.User.dates_collected_today.desc()).limit(limit).all()
+    ).all()
     
-    return [
-        {
-            "username": f"{u.username}#{u.id}" if u.username else f"User #{u.id}",
-            "dates": u.dates_collected_today,
-            "photo": u.profile_photo
-        }
-        for u in results
-    ]
+    _daily_board.load(rows)
+    _daily_board_date = date_str
+
+def _get_daily_board(db: Session, date_str: str) -> RankIndex:
+    if _daily_board_date != date_str:
+        load_daily_leaderboard(db, date_str)
+    return _daily_board
+
+def _format_daily_entry(entry: dict) -> dict:
+    return {
+        "id": entry["id"],
+        "username": f"{entry['username']}#{entry['id']}" if entry["username"] else f"User #{entry['id']}",
+        "dates": entry["value"],
+        "photo": entry["photo"]
+    }
+
+def get_daily_leaderboard(db: Session, limit: int = 3):
+    board = _get_daily_board(db, _leaderboard_date())
+    return [_format_daily_entry(e) for e in board.top(limit)]
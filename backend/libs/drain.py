@@ -0,0 +1,178 @@
+import asyncio
+import random
+import signal
+import threading
+import time
+from typing import Optional
+from fastapi import HTTPException, WebSocket
+from libs import security, spectators
+from libs.leaderboard_feed import feed
+from libs.logger import get_logger
+from libs.matchmaking import matchmaker
+from libs.settings import settings
+from libs.websocket_manager import manager, server_time_ms
+
+logger = get_logger(__name__)
+
+SERVICE_RESTART = 1012 # WebSocket close code: server restarting, reconnect
+
+class Drainer:
+    """
+    Hands live players over to other instances on deploy instead of cutting them off.
+    Started by SIGTERM (before the server's own shutdown closes every socket) or POST /api/admin/drain:
+    - /health turns 503 so the load balancer stops routing here; new sessions are refused
+    - every player gets a resume token; players between races are sent away now, players
+      mid-race once their race is over (or at DRAIN_TIMEOUT)
+    - clients are told to wait a random 0..DRAIN_RECONNECT_SPREAD seconds first, so
+      reconnects to the remaining instances are spread out rather than arriving all at once
+    The lifespan shutdown then flushes replays and logs as usual.
+    A session's live state (journal, crash flags, race_id) exists only on the instance its players
+    reconnect to, so a session resumes correctly only if all of its players land on the same one:
+    the load balancer must route /api/game/ws/<session_id> sticky by session_id (e.g. hash on the
+    path). Without that, only lobbies with no race running are handed off cleanly; races still
+    running at DRAIN_TIMEOUT are split across instances.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.handed_off = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closed = set()
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            # Refuse new sessions from this moment on
+            self.draining = True
+            self.started_at = time.monotonic()
+            self._task = asyncio.create_task(self._drain())
+        return self._task
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def install_signal_handler(self):
+        """
+        SIGTERM drains first and then hands over to the previous handler (uvicorn's
+        graceful exit). A second SIGTERM skips the rest of the drain.
+        """
+        if not settings.DRAIN_ON_SIGTERM or threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def exit_now(signum, frame):
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                signal.signal(signal.SIGTERM, previous)
+                signal.raise_signal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame):
+            if self.draining:
+                exit_now(signum, frame)
+                return
+            loop.call_soon_threadsafe(lambda: self.start().add_done_callback(lambda _: exit_now(signum, frame)))
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    def status(self) -> dict:
+        return {
+            "draining": self.draining,
+            "done": self.finished_at is not None,
+            "elapsed_s": round((self.finished_at or time.monotonic()) - self.started_at, 1) if self.started_at else None,
+            "handed_off": self.handed_off,
+            "players_left": sum(len(connections) for connections in manager.active_connections.values())
+        }
+
+    async def _drain(self):
+        deadline = self.started_at + settings.DRAIN_TIMEOUT
+        logger.info(f"Draining: {self.status()['players_left']} players connected, waiting up to {settings.DRAIN_TIMEOUT}s for races")
+
+        # Queued tickets can't turn into lobbies here any more; clients re-queue elsewhere
+        await matchmaker.stop()
+        others = list(matchmaker.subscribers.values()) + list(feed.subscribers)
+        others += [viewer.websocket for viewers in spectators.hub.sessions.values() for viewer in viewers]
+        await asyncio.gather(*(self._close(ws) for ws in others))
+
+        await asyncio.gather(*(self._notify(session_id) for session_id in list(manager.active_connections)))
+        while True:
+            finished = [s for s in list(manager.active_connections) if not self._race_running(s)]
+            await asyncio.gather(*(self._close_session(s) for s in finished))
+            if not manager.active_connections or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.5)
+        # Deadline: whoever is still racing resumes elsewhere
+        await asyncio.gather(*(self._close_session(s) for s in list(manager.active_connections)))
+
+        self.finished_at = time.monotonic()
+        logger.info(f"Drain finished in {self.finished_at - self.started_at:.1f}s, {self.handed_off} players handed off")
+
+    def _race_running(self, session_id: str) -> bool:
+        journal = manager.journals.get(session_id)
+        if journal is None or journal.game_start is None:
+            return False
+        # A race is over once every connected player has crashed
+        return any(
+            not journal.players.get(str(manager.connection_users.get(ws)), {}).get("crashed")
+            for ws in manager.active_connections.get(session_id, [])
+        )
+
+    def _reconnect_after_ms(self) -> int:
+        return random.randint(0, int(settings.DRAIN_RECONNECT_SPREAD * 1000))
+
+    async def _notify(self, session_id: str):
+        journal = manager.journals.get(session_id)
+        race_id = journal.race_id if journal else None
+        large = session_id in manager.large_sessions
+        running = self._race_running(session_id)
+        for ws in list(manager.active_connections.get(session_id, [])):
+            user_id = manager.connection_users.get(ws)
+            if user_id is None:
+                continue
+            try:
+                await ws.send_json({
+                    "type": "server_draining",
+                    # Reconnect with ?resume=<token>&last_seq=0 instead of ?token=: the next instance's
+                    # journal starts over, so sequence numbers from this one mean nothing there
+                    "resume_token": security.create_resume_token(user_id, session_id, race_id, large),
+                    "reconnect": "after_race" if running else "now",
+                    "reconnect_after_ms": self._reconnect_after_ms(),
+                    "server_ts": server_time_ms()
+                })
+            except Exception:
+                pass
+
+    async def _close_session(self, session_id: str):
+        connections = list(manager.active_connections.get(session_id, []))
+        await asyncio.gather(*(self._close(ws) for ws in connections))
+        self.handed_off += len(connections)
+        # The endpoint's own cleanup would do this once the close is acknowledged
+        for ws in connections:
+            manager.disconnect(ws, session_id)
+
+    async def _close(self, websocket: WebSocket):
+        if websocket in self._closed:
+            return
+        self._closed.add(websocket)
+        try:
+            await websocket.close(code=SERVICE_RESTART, reason=f"Server restarting, reconnect_after_ms={self._reconnect_after_ms()}")
+        except Exception:
+            pass
+
+drainer = Drainer()
+
+def refuse_new_sessions():
+    """Route dependency: anything that would start a new session is refused (503) while draining."""
+    if drainer.draining:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is restarting, please retry",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)}
+        )
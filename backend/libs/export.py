@@ -0,0 +1,129 @@
+"""
+Streaming export of games joined to users and races, as CSV or NDJSON (optionally gzipped).
+
+Rows are read in keyset chunks of EXPORT_CHUNK_ROWS by games.id. Each chunk is one short
+read transaction streamed through a server-side cursor (stream_results / yield_per), so
+memory stays constant and no transaction stays open for the whole export.
+
+CLI (from backend/):
+    python -m libs.export --format csv --start 2026-03-01 --end 2026-04-01 --gzip -o games.csv.gz
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import select
+from database import models
+from database.database import SessionLocal, ReadSessionLocal
+from libs.settings import settings
+
+COLUMNS = [
+    "game_id", "user_id", "username", "race_id", "race_name", "session_id", "car_index",
+    "assigned_lane", "score", "quarantined", "finished_at", "race_created_at"
+]
+
+def _query(after_id: int, start: Optional[datetime], end: Optional[datetime], session_id: Optional[int]):
+    stmt = (
+        select(
+            models.Game.id, models.Game.user_id, models.User.username, models.Game.race_id,
+            models.Race.name, models.Game.multiplayer_session_id, models.Game.car_index,
+            models.Game.assigned_lane, models.Game.score, models.Game.quarantined,
+            models.Game.finished_at, models.Race.created_at
+        )
+        .join(models.User, models.User.id == models.Game.user_id)
+        .outerjoin(models.Race, models.Race.id == models.Game.race_id)
+        .where(models.Game.id > after_id)
+        .order_by(models.Game.id)
+        .limit(settings.EXPORT_CHUNK_ROWS)
+    )
+    if start:
+        stmt = stmt.where(models.Game.finished_at >= start)
+    if end:
+        stmt = stmt.where(models.Game.finished_at < end)
+    if session_id is not None:
+        stmt = stmt.where(models.Game.multiplayer_session_id == session_id)
+    return stmt.execution_options(stream_results=True, yield_per=settings.EXPORT_BATCH_SIZE)
+
+def iter_rows(start: Optional[datetime] = None, end: Optional[datetime] = None, session_id: Optional[int] = None) -> Iterator[tuple]:
+    session_factory = ReadSessionLocal or SessionLocal
+    after_id = 0
+    while True:
+        db = session_factory()
+        try:
+            count = 0
+            for row in db.execute(_query(after_id, start, end, session_id)):
+                count += 1
+                after_id = row[0]
+                yield tuple(row)
+        finally:
+            # Ends the chunk's transaction before the next one starts
+            db.close()
+        if count < settings.EXPORT_CHUNK_ROWS:
+            return
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def iter_csv(rows: Iterator[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([_value(v) for v in row])
+        if buffer.tell() >= settings.EXPORT_FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_ndjson(rows: Iterator[tuple]) -> Iterator[str]:
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(COLUMNS, map(_value, row))), separators=(",", ":")) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= settings.EXPORT_FLUSH_BYTES:
+            yield "".join(lines)
+            lines = []
+            size = 0
+    yield "".join(lines)
+
+def gzip_stream(chunks: Iterator[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export(format: str = "csv", start: Optional[datetime] = None, end: Optional[datetime] = None,
+           session_id: Optional[int] = None, gzip: bool = False) -> Iterator[bytes]:
+    """Export as a stream of byte chunks."""
+    rows = iter_rows(start, end, session_id)
+    chunks = iter_csv(rows) if format == "csv" else iter_ndjson(rows)
+    if gzip:
+        return gzip_stream(chunks)
+    return (chunk.encode() for chunk in chunks if chunk)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export games joined to users and races")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="finished_at >= (ISO date/time)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="finished_at < (ISO date/time)")
+    parser.add_argument("--session-id", type=int)
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export(args.format, args.start, args.end, args.session_id, args.gzip):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
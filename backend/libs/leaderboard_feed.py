@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+from typing import Dict, Optional, Set
+from fastapi import WebSocket
+from libs.logger import get_logger
+from libs.settings import settings
+
+logger = get_logger(__name__)
+
+class LeaderboardFeed:
+    """
+    Pushes leaderboard changes to subscribed clients (/game/ws/leaderboards).
+    Clients get one snapshot on connect, then only deltas.
+    Producers (score submit, date collect, daily reset) may run on the event loop
+    or on the background monitor thread, so publish_* is thread-safe.
+    Pending changes are coalesced and flushed at most every LEADERBOARD_PUSH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[WebSocket] = set()
+        # user_id -> latest entry (later publishes overwrite earlier ones)
+        self._pending_scores: Dict[int, dict] = {}
+        self._pending_dates: Dict[int, dict] = {}
+        self._pending_daily_reset = False
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Starts the flush task. Must be called from the running event loop (app lifespan)."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def subscribe(self, websocket: WebSocket, snapshot: dict):
+        await websocket.accept()
+        await websocket.send_json({"type": "leaderboard_snapshot", **snapshot})
+        self.subscribers.add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket):
+        self.subscribers.discard(websocket)
+
+    def publish_score(self, user_id: int, username: Optional[str], score: int, photo: Optional[str]):
+        with self._lock:
+            self._pending_scores[user_id] = {
+                "id": user_id,
+                "username": f"{username}#{user_id}",
+                "score": score,
+                "photo": photo
+            }
+        self._signal()
+
+    def publish_dates(self, user_id: int, username: Optional[str], dates: int, photo: Optional[str]):
+        with self._lock:
+            self._pending_dates[user_id] = {
+                "id": user_id,
+                "username": f"{username}#{user_id}" if username else f"User #{user_id}",
+                "dates": dates,
+                "photo": photo
+            }
+        self._signal()
+
+    def publish_daily_reset(self):
+        with self._lock:
+            # Anything collected before the reset is superseded by it
+            self._pending_dates.clear()
+            self._pending_daily_reset = True
+        self._signal()
+
+    def _signal(self):
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _take_delta(self) -> Optional[dict]:
+        with self._lock:
+            if not (self._pending_scores or self._pending_dates or self._pending_daily_reset):
+                return None
+            delta = {
+                "type": "leaderboard_delta",
+                "global": list(self._pending_scores.values()),
+                "daily": list(self._pending_dates.values()),
+                "daily_reset": self._pending_daily_reset
+            }
+            self._pending_scores = {}
+            self._pending_dates = {}
+            self._pending_daily_reset = False
+        return delta
+
+    async def _send(self, websocket: WebSocket, payload: str):
+        try:
+            # A stalled socket must not hold up the push for everyone else
+            await asyncio.wait_for(websocket.send_text(payload), settings.LEADERBOARD_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Leaderboard subscriber too slow, dropping it")
+            self.unsubscribe(websocket)
+            # Half-written frame: the socket is unusable now; don't wait on the close either
+            asyncio.create_task(self._close(websocket))
+        except Exception as e:
+            logger.error(f"Error pushing leaderboard update: {e}")
+            self.unsubscribe(websocket)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1008, reason="Too slow"), settings.LEADERBOARD_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            delta = self._take_delta()
+            if delta and self.subscribers:
+                # Encode once, fan out to everyone
+                payload = json.dumps(delta)
+                await asyncio.gather(*(self._send(ws, payload) for ws in list(self.subscribers)))
+
+            # Coalesce: anything published meanwhile goes out in the next batch
+            await asyncio.sleep(settings.LEADERBOARD_PUSH_INTERVAL)
+
+feed = LeaderboardFeed()
@@ -1,40 +1,125 @@
+import json
 import logging
 import logging.handlers
 import queue
 import sys
-from typing import Optional
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from libs.settings import settings
 
 # Global QueueListener instance
 _listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+_site_filter: Optional["CallSiteRateLimit"] = None
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler over a bounded queue: when the listener can't keep up,
+    records are dropped and counted instead of blocking the caller or growing memory.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process, so no need to flatten the record; the listener's
+        # formatter still sees exc_info and the `suppressed` count.
+        return record
+
+class CallSiteRateLimit(logging.Filter):
+    """
+    Per call site (file:line) token bucket. Once a site is over budget only every
+    LOG_SAMPLE_EVERY-th record gets through; the next record that passes carries
+    how many were suppressed in between.
+    """
+
+    def __init__(self, rate: float, burst: float, sample_every: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample_every = max(1, sample_every)
+        # (pathname, lineno) -> [tokens, updated, suppressed since last emitted]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [self.burst, now, 0]
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if site[0] >= 1:
+                site[0] -= 1
+            elif (site[2] + 1) % self.sample_every:
+                site[2] += 1
+                self.suppressed += 1
+                return False
+            if site[2]:
+                record.suppressed = site[2]
+                site[2] = 0
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
 def setup_logging():
     """
-    Sets up a non-blocking logger using QueueHandler and QueueListener.
+    Sets up a non-blocking logger using a bounded QueueHandler and QueueListener.
     This should be called at application startup.
     """
-    global _listener
+    global _listener, _queue_handler, _site_filter
 
-    # Create a shared queue for log records
-    log_queue = queue.Queue(-1)  # Infinite size
+    # Bounded: under a burst, records are dropped (and counted) rather than queued forever
+    log_queue = queue.Queue(settings.LOG_QUEUE_SIZE)
 
     # Create the QueueHandler (non-blocking)
-    queue_handler = logging.handlers.QueueHandler(log_queue)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _site_filter = CallSiteRateLimit(settings.LOG_SITE_RATE, settings.LOG_SITE_BURST, settings.LOG_SAMPLE_EVERY)
+    _queue_handler.addFilter(_site_filter)
 
     # Configure root logger to output to the queue
     root = logging.getLogger()
-    root.setLevel(logging.INFO)
+    root.setLevel(settings.LOG_LEVEL)
     # Remove existing handlers to avoid duplication if re-initialized
-    if root.handlers:
-        for handler in root.handlers:
-            root.removeHandler(handler)
-    root.addHandler(queue_handler)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
 
     # Create the actual handler that will write logs (runs in a separate thread)
     console_handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    console_handler.setFormatter(formatter)
+    if settings.LOG_JSON:
+        console_handler.setFormatter(JsonFormatter())
+    else:
+        console_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        ))
 
     # Create and start the listener
     _listener = logging.handlers.QueueListener(log_queue, console_handler)
@@ -47,9 +132,23 @@ def shutdown_logging():
     """
     global _listener
     if _listener:
-        _listener.stop()
+        while True:
+            try:
+                _listener.stop()
+                break
+            except queue.Full:
+                # Sentinel couldn't be queued yet; let the listener drain a little
+                time.sleep(0.05)
         _listener = None
 
+def log_stats() -> dict:
+    """Records dropped on a full queue and suppressed by per-call-site rate limiting."""
+    return {
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "suppressed": _site_filter.suppressed if _site_filter else 0,
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0
+    }
+
 def get_logger(name: str):
     """
     Returns a logger instance with the given name.
@@ -0,0 +1,308 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import WebSocket
+from database import models
+from database.database import SessionLocal
+from libs import plausibility, race_setup
+from libs.logger import get_logger
+from libs.settings import settings
+from libs.websocket_manager import manager
+
+logger = get_logger(__name__)
+
+@dataclass
+class Ticket:
+    user_id: int
+    username: Optional[str]
+    max_players: int
+    car_index: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+class Matchmaker:
+    """
+    In-memory matchmaking queue, one FIFO per lobby size.
+    Every MATCHMAKING_INTERVAL the matcher forms as many full lobbies as it can; a partial
+    lobby (>= MATCHMAKING_MIN_PLAYERS) is formed once its oldest ticket has waited MATCHMAKING_MAX_WAIT.
+    All lobbies of a pass are created (session, games, race) in one transaction, then players
+    are notified on /game/ws/matchmaking and the race is started in each session journal.
+    A player who cancels or re-queues while their batch is being created stays in that race
+    as a no-show, but is not sent its match_found.
+    """
+
+    def __init__(self):
+        # max_players -> tickets in arrival order
+        self.queues: Dict[int, List[Ticket]] = {}
+        # user_id -> ticket (one ticket per user)
+        self.tickets: Dict[int, Ticket] = {}
+        # user_id -> websocket waiting for match_found
+        self.subscribers: Dict[int, WebSocket] = {}
+        # user_id -> (match, matched_at) until delivered or MATCHMAKING_MATCH_TTL, for clients that poll
+        self.matches: Dict[int, Tuple[dict, float]] = {}
+        # Tickets of the batch currently being created, and who withdrew from it meanwhile
+        self.in_flight: Dict[int, Ticket] = {}
+        self.withdrawn: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        # Metrics
+        self.wait_times: deque = deque(maxlen=1000)
+        self.pass_times: deque = deque(maxlen=100)
+        self.matched = 0
+        self.lobbies = 0
+        self.expired = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, ticket: Ticket) -> int:
+        """Queues a ticket (replacing any previous one for the user). Returns its queue position."""
+        self.cancel(ticket.user_id)
+        self.matches.pop(ticket.user_id, None)
+        self.tickets[ticket.user_id] = ticket
+        queue = self.queues.setdefault(ticket.max_players, [])
+        queue.append(ticket)
+        return len(queue)
+
+    def cancel(self, user_id: int) -> bool:
+        ticket = self.tickets.pop(user_id, None)
+        if ticket is None:
+            if user_id in self.in_flight and user_id not in self.withdrawn:
+                self.withdrawn.add(user_id)
+                return True
+            return False
+        queue = self.queues.get(ticket.max_players, [])
+        if ticket in queue:
+            queue.remove(ticket)
+        return True
+
+    def position(self, user_id: int) -> Optional[int]:
+        ticket = self.tickets.get(user_id)
+        if ticket is None:
+            return None
+        return self.queues[ticket.max_players].index(ticket) + 1
+
+    async def subscribe(self, websocket: WebSocket, user_id: int):
+        await websocket.accept()
+        self.subscribers[user_id] = websocket
+        # Matched before the socket connected
+        if user_id in self.matches:
+            await self._notify(user_id, self.matches[user_id][0])
+
+    def take_match(self, user_id: int) -> Optional[dict]:
+        """The user's undelivered match, if any (handed out once)."""
+        entry = self.matches.pop(user_id, None)
+        return entry[0] if entry else None
+
+    def _expire_matches(self, now: float):
+        for user_id in [u for u, (_, matched_at) in self.matches.items() if now - matched_at > settings.MATCHMAKING_MATCH_TTL]:
+            del self.matches[user_id]
+
+    def unsubscribe(self, user_id: int, websocket: WebSocket):
+        if self.subscribers.get(user_id) is websocket:
+            del self.subscribers[user_id]
+
+    def form_groups(self, now: Optional[float] = None) -> List[List[Ticket]]:
+        """Takes matched groups out of the queues (pure in-memory step of a matcher pass)."""
+        now = time.monotonic() if now is None else now
+        groups = []
+        for size, queue in self.queues.items():
+            # Drop tickets nobody is waiting on anymore
+            while queue and now - queue[0].enqueued_at > settings.MATCHMAKING_TICKET_TTL:
+                ticket = queue.pop(0)
+                del self.tickets[ticket.user_id]
+                self.expired += 1
+
+            full = len(queue) // size
+            groups.extend(queue[i * size:(i + 1) * size] for i in range(full))
+            del queue[:full * size]
+
+            # Partial lobby once the oldest player has waited long enough
+            if (
+                len(queue) >= max(1, min(settings.MATCHMAKING_MIN_PLAYERS, size))
+                and now - queue[0].enqueued_at >= settings.MATCHMAKING_MAX_WAIT
+            ):
+                groups.append(queue[:])
+                queue.clear()
+
+        for group in groups:
+            for ticket in group:
+                del self.tickets[ticket.user_id]
+        return groups
+
+    def create_lobbies(self, groups: List[List[Ticket]]) -> List[dict]:
+        """Creates sessions, races and games for every group in a single transaction."""
+        db = SessionLocal()
+        try:
+            sessions = [
+                models.MultiplayerSession(
+                    host_id=group[0].user_id,
+                    max_players=group[0].max_players,
+                    game_seed=str(uuid.uuid4()),
+                    status="started"
+                )
+                for group in groups
+            ]
+            db.add_all(sessions)
+            db.flush()
+
+            setups = [
+                race_setup.build_race_config(session.game_seed, [t.user_id for t in group], session.host_id, session.max_players)
+                for session, group in zip(sessions, groups)
+            ]
+            races = [
+                models.Race(name=f"Race for Session {session.id}", config=config, car_index=0)
+                for session, (config, _) in zip(sessions, setups)
+            ]
+            db.add_all(races)
+            db.flush()
+
+            db.add_all([
+                models.Game(
+                    user_id=ticket.user_id,
+                    race_id=race.id,
+                    multiplayer_session_id=session.id,
+                    car_index=ticket.car_index,
+                    assigned_lane=lane_map[str(ticket.user_id)],
+                    score=0,
+                    finished_at=None
+                )
+                for session, race, (_, lane_map), group in zip(sessions, races, setups, groups)
+                for ticket in group
+            ])
+            db.commit()
+
+            return [
+                {
+                    "session_id": str(session.id),
+                    "host_id": session.host_id,
+                    "max_players": session.max_players,
+                    "race_id": race.id,
+                    "config": config,
+                    "seed": session.game_seed,
+                    "lane_assignments": lane_map,
+                    "players": [{"id": t.user_id, "username": f"{t.username}#{t.user_id}"} for t in group]
+                }
+                for session, race, (config, lane_map), group in zip(sessions, races, setups, groups)
+            ]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run_once(self) -> int:
+        """One matcher pass. Returns the number of players matched."""
+        self._expire_matches(time.monotonic())
+        groups = self.form_groups()
+        if not groups:
+            return 0
+
+        self.in_flight = {ticket.user_id: ticket for group in groups for ticket in group}
+        self.withdrawn = set()
+        try:
+            return await self._create_and_notify(groups)
+        finally:
+            self.in_flight = {}
+            self.withdrawn = set()
+
+    def _requeue(self, groups: List[List[Ticket]]):
+        # Back at the front, in their original order; skip anyone who cancelled or re-queued meanwhile
+        by_size: Dict[int, List[Ticket]] = {}
+        for group in groups:
+            for ticket in group:
+                if ticket.user_id not in self.withdrawn and ticket.user_id not in self.tickets:
+                    by_size.setdefault(ticket.max_players, []).append(ticket)
+        for size, tickets in by_size.items():
+            for ticket in tickets:
+                self.tickets[ticket.user_id] = ticket
+            self.queues.setdefault(size, [])[:0] = tickets
+
+    async def _create_and_notify(self, groups: List[List[Ticket]]) -> int:
+        started = time.perf_counter()
+        try:
+            lobbies = await asyncio.to_thread(self.create_lobbies, groups)
+        except Exception as e:
+            logger.error(f"Matchmaking: error creating lobbies, requeueing: {e}")
+            self._requeue(groups)
+            return 0
+        self.pass_times.append(time.perf_counter() - started)
+
+        now = time.monotonic()
+        for group, lobby in zip(groups, lobbies):
+            players = len(group)
+            plausibility.races.register(lobby["race_id"], lobby["seed"], players)
+            session_id = lobby["session_id"]
+            manager.set_large(session_id, race_setup.is_large_lobby(lobby["max_players"]))
+            # Journaled, so players get it on connect (last_seq=0) even if they miss match_found
+            await manager.broadcast({
+                "type": "game_start",
+                "race_id": lobby["race_id"],
+                "config": lobby["config"],
+                "seed": lobby["seed"],
+                "lane_assignments": lobby["lane_assignments"]
+            }, session_id)
+
+            message = {"type": "match_found", **lobby}
+            for ticket in group:
+                self.wait_times.append(now - ticket.enqueued_at)
+                if ticket.user_id in self.withdrawn:
+                    continue
+                self.matches[ticket.user_id] = (message, now)
+                await self._notify(ticket.user_id, message)
+            self.matched += players
+            self.lobbies += 1
+        return sum(len(group) for group in groups)
+
+    async def _notify(self, user_id: int, message: dict):
+        websocket = self.subscribers.get(user_id)
+        if websocket is None:
+            return
+        try:
+            await websocket.send_json(message)
+            # Delivered; polling clients would have taken it themselves
+            self.matches.pop(user_id, None)
+        except Exception as e:
+            logger.error(f"Matchmaking: error notifying user {user_id}: {e}")
+            self.unsubscribe(user_id, websocket)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Matchmaking pass failed: {e}")
+            await asyncio.sleep(settings.MATCHMAKING_INTERVAL)
+
+    def stats(self) -> dict:
+        waits = list(self.wait_times)
+        passes = list(self.pass_times)
+        return {
+            "queued": {size: len(queue) for size, queue in self.queues.items() if queue},
+            "matched": self.matched,
+            "lobbies": self.lobbies,
+            "expired": self.expired,
+            "time_to_match_p50": _percentile(waits, 0.5),
+            "time_to_match_p90": _percentile(waits, 0.9),
+            "time_to_match_p99": _percentile(waits, 0.99),
+            "pass_seconds_p50": _percentile(passes, 0.5),
+            "pass_seconds_max": round(max(passes), 3) if passes else None
+        }
+
+matchmaker = Matchmaker()
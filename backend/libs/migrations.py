@@ -0,0 +1,60 @@
+"""
+Cheap "is the database already at head?" check for container startup.
+
+`alembic upgrade head` imports alembic, env.py, the ORM models and every migration
+before it can decide there's nothing to do. This reads the revision ids straight from
+alembic/versions and compares them with alembic_version, so entrypoint.sh only runs
+the real upgrade when it's needed.
+
+    python -m libs.migrations   # exit 0: at head, 1: upgrade needed (or check failed)
+"""
+import re
+import sys
+from pathlib import Path
+
+VERSIONS_DIR = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+
+_REVISION = re.compile(r"^revision\s*(?::[^=]+)?=\s*['\"](\w+)['\"]", re.M)
+_DOWN_REVISION = re.compile(r"^down_revision\s*(?::[^=]+)?=\s*(.+)$", re.M)
+_REVISION_ID = re.compile(r"['\"](\w+)['\"]")
+
+def script_heads() -> set:
+    """Revisions in alembic/versions that no other revision builds on."""
+    revisions, parents = set(), set()
+    for path in VERSIONS_DIR.glob("*.py"):
+        source = path.read_text()
+        revision = _REVISION.search(source)
+        if not revision:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = _DOWN_REVISION.search(source)
+        if down_revision:
+            # Merge revisions have a tuple of parents
+            parents.update(_REVISION_ID.findall(down_revision.group(1)))
+    return revisions - parents
+
+def database_revisions(url: str) -> set:
+    from sqlalchemy import create_engine, text
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            try:
+                return {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+            except Exception:
+                # Fresh database: no alembic_version table yet
+                return set()
+    finally:
+        engine.dispose()
+
+def is_at_head(url: str) -> bool:
+    heads = script_heads()
+    return bool(heads) and database_revisions(url) == heads
+
+if __name__ == "__main__":
+    from libs.settings import settings
+    try:
+        at_head = is_at_head(settings.DATABASE_URL)
+    except Exception as e:
+        print(f"Migration check failed: {e}", file=sys.stderr)
+        at_head = False
+    sys.exit(0 if at_head else 1)
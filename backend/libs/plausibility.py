@@ -0,0 +1,40 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from libs.settings import settings
+
+# The numpy-based bound itself lives in libs.score_bounds and is imported on first use
+# (numpy is ~100ms of import time that startup doesn't need).
+
+class RaceRegistry:
+    """
+    Seed, start time and player count of recent races, recorded when they're created
+    so score submission can be checked without reading the race back from the DB.
+    """
+
+    def __init__(self, max_races: int):
+        self._races: "OrderedDict[int, Tuple[str, float, int]]" = OrderedDict()
+        self._max_races = max_races
+        self._lock = threading.Lock()
+
+    def register(self, race_id: int, seed: str, players: int, started_at: Optional[float] = None):
+        with self._lock:
+            self._races[race_id] = (seed, started_at or time.time(), players)
+            self._races.move_to_end(race_id)
+            while len(self._races) > self._max_races:
+                self._races.popitem(last=False)
+
+    def get(self, race_id: int) -> Optional[Tuple[str, float, int]]:
+        with self._lock:
+            return self._races.get(race_id)
+
+races = RaceRegistry(settings.SCORE_PLAUSIBILITY_MAX_RACES)
+
+def is_plausible(score: int, seed: str, started_at: float, players: int) -> bool:
+    elapsed = time.time() - started_at
+    if not math.isfinite(elapsed):
+        return False
+    from libs.score_bounds import plausible_batch
+    return bool(plausible_batch([score], [seed], [elapsed], [players])[0])
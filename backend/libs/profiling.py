@@ -0,0 +1,240 @@
+import asyncio
+import contextvars
+import html
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+from fastapi.responses import JSONResponse
+from libs.logger import get_logger
+from libs.settings import settings
+
+logger = get_logger(__name__)
+
+# Server-Timing: per-request durations (ms) split into auth / db / serialize.
+# The parts don't overlap (SQL run inside a span counts as db only), so they add up to at most total.
+
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+server_timing_enabled = settings.SERVER_TIMING_ENABLED
+
+def add_timing(name: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+@contextmanager
+def span(name: str):
+    """Adds the block's duration, minus SQL time within it (already in `db`), to the Server-Timing entry `name`."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    db_before = timings.get("db", 0.0)
+    try:
+        yield
+    finally:
+        db_seconds = (timings.get("db", 0.0) - db_before) / 1000
+        add_timing(name, max(0.0, time.perf_counter() - started - db_seconds))
+
+def instrument_engine(engine):
+    """Counts time spent in SQL statements towards the `db` timing."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _timings.get() is not None:
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if started:
+            add_timing("db", time.perf_counter() - started.pop())
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class: JSON encoding counts towards the `serialize` timing."""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return super().render(content)
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header (auth, db, serialize, total) when enabled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not server_timing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = (time.perf_counter() - started) * 1000
+                value = ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+
+# Sampling profiler
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a thread samples every thread's stack every PROFILER_INTERVAL
+    seconds and counts collapsed stacks ("outer;...;inner" -> samples), the input
+    format of flamegraph.pl / speedscope. Only one run at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+
+    def _sample(self, stacks: Counter, own_thread: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            frames.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(frames))] += 1
+
+    def _run(self, seconds: float, stacks: Counter):
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self._sample(stacks, own_thread)
+            time.sleep(settings.PROFILER_INTERVAL)
+
+    async def profile(self, seconds: float) -> Optional[Counter]:
+        """Samples for `seconds`. Returns None if a profile is already running."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        self.running = True
+        try:
+            stacks: Counter = Counter()
+            await asyncio.to_thread(self._run, seconds, stacks)
+            return stacks
+        finally:
+            self.running = False
+            self._lock.release()
+
+profiler = SamplingProfiler()
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+def flamegraph_svg(stacks: Counter, width: int = 1200, row_height: int = 16) -> str:
+    """Minimal self-contained flamegraph (root at the bottom, hover for details)."""
+    # Build the call tree: name -> [samples, children]
+    root = [0, {}]
+    for stack, count in stacks.items():
+        node = root
+        node[0] += count
+        for name in stack.split(";"):
+            node = node[1].setdefault(name, [0, {}])
+            node[0] += count
+    total = root[0] or 1
+
+    rects = []
+    max_depth = 0
+
+    def walk(children: dict, x: float, depth: int):
+        nonlocal max_depth
+        max_depth = max(max_depth, depth)
+        for name, (count, grandchildren) in sorted(children.items()):
+            w = count / total * width
+            if w >= 0.5:
+                rects.append((x, depth, w, name, count))
+                walk(grandchildren, x, depth + 1)
+            x += w
+
+    walk(root[1], 0.0, 0)
+    height = (max_depth + 1) * row_height
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">']
+    for x, depth, w, name, count in rects:
+        y = height - (depth + 1) * row_height
+        hue = 20 + (hash(name) % 40)
+        label = html.escape(name)
+        parts.append(
+            f'<g><title>{label} ({count} samples, {count / total:.1%})</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},90%,60%)"/>'
+        )
+        if w > 40:
+            parts.append(f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{html.escape(name[: int(w / 7)])}</text>')
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "".join(parts)
+
+# Event loop watchdog
+
+class LoopWatchdog:
+    """
+    Logs the event loop thread's stack whenever a single callback blocks the loop for
+    longer than LOOP_BLOCK_THRESHOLD. A loop task bumps a heartbeat; a watcher thread
+    notices when it goes stale and captures what the loop is running at that moment.
+    """
+
+    def __init__(self):
+        self.threshold = settings.LOOP_BLOCK_THRESHOLD
+        self.enabled = False
+        self.blocked = 0
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Must be called from the running event loop."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.enabled = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self):
+        reported = 0.0
+        # A stop/start cycle replaces the thread; the old one just exits
+        while self.enabled and self._thread is threading.current_thread():
+            time.sleep(self.threshold / 4)
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            # Report each stall once, as soon as it crosses the threshold
+            if stalled > self.threshold and beat != reported:
+                reported = beat
+                self.blocked += 1
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+                logger.warning(f"Event loop blocked for over {stalled * 1000:.0f}ms, currently running:\n{stack}")
+
+watchdog = LoopWatchdog()
@@ -0,0 +1,83 @@
+import json
+import random
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from libs.settings import settings
+
+def is_large_lobby(max_players: int) -> bool:
+    return max_players > settings.LARGE_LOBBY_THRESHOLD
+
+def build_race_config(seed: str, user_ids: List[int], host_id: int, max_players: int) -> Tuple[dict, Dict[str, int]]:
+    """
+    Multiplayer race config for the given players, plus their (1-based) lane assignments.
+    Lanes scale with player count; large lobbies share at most LARGE_LOBBY_MAX_LANES round-robin.
+    """
+    # Only the sections written below are copied; the rest is shared read-only with GAME_CONFIG
+    config = dict(settings.GAME_CONFIG)
+    config["world"] = {**config["world"], "seed": seed}
+    config["lanes"] = dict(config["lanes"])
+    config["player"] = dict(config["player"])
+    config["is_multiplayer"] = True
+
+    # Strict matching: 2 players -> 2 lanes. 3 players -> 3 lanes.
+    max_lanes = max(1, len(user_ids)) # Ensure at least 1 lane
+    if is_large_lobby(max_players):
+        max_lanes = min(max_lanes, settings.LARGE_LOBBY_MAX_LANES)
+    config["lanes"]["maxLanes"] = max_lanes
+
+    # Randomize lanes for all players
+    available_lanes = list(range(1, max_lanes + 1))
+    random.shuffle(available_lanes)
+    lane_map = {str(user_id): available_lanes[i % len(available_lanes)] for i, user_id in enumerate(user_ids)}
+
+    # Start car in one of the assigned lanes (e.g. Host's)
+    config["player"]["initialLane"] = lane_map.get(str(host_id), 1)
+    return config, lane_map
+
+# Starts (or restarts) a lobby's race in one statement. The session row is claimed with
+# a compare-and-set on the seed the caller read: of concurrent start/retry clicks only
+# the first gets the row, the others re-check after its commit, find a new seed and do
+# nothing. The participant count is checked too, so a player who joined after the lanes
+# were computed doesn't end up without one. All games are moved to the new race by a
+# single UPDATE, whatever the lobby size.
+START_RACE_SQL = text("""
+WITH sess AS (
+    UPDATE multiplayer_sessions
+    SET status = 'started', game_seed = :seed
+    WHERE id = :session_id
+      AND game_seed IS NOT DISTINCT FROM :prev_seed
+      AND (SELECT count(*) FROM games WHERE multiplayer_session_id = :session_id) = :num_players
+    RETURNING id
+),
+race AS (
+    INSERT INTO races (name, config, car_index, status)
+    SELECT 'Race for Session ' || sess.id, CAST(:config AS json), 0, 'active'
+    FROM sess
+    RETURNING id
+),
+game_upd AS (
+    UPDATE games
+    SET race_id = race.id, assigned_lane = l.lane, score = 0, finished_at = NULL
+    FROM race, unnest(CAST(:user_ids AS integer[]), CAST(:lanes AS integer[])) AS l(user_id, lane)
+    WHERE games.multiplayer_session_id = :session_id AND games.user_id = l.user_id
+    RETURNING games.id
+)
+SELECT id FROM race
+""")
+
+def start_race(db: Session, session_id: int, prev_seed: Optional[str], seed: str,
+               config: dict, lane_map: Dict[str, int]) -> Optional[int]:
+    """
+    Claims the session for a new race and links its games (not committed).
+    Returns the race id, or None if another start won the race or the lobby changed.
+    """
+    return db.execute(START_RACE_SQL, {
+        "session_id": session_id,
+        "prev_seed": prev_seed,
+        "seed": seed,
+        "num_players": len(lane_map),
+        "config": json.dumps(config),
+        "user_ids": [int(user_id) for user_id in lane_map],
+        "lanes": list(lane_map.values()),
+    }).scalar()
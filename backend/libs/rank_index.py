@@ -0,0 +1,95 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+class RankIndex:
+    """
+    In-memory leaderboard ordered by value desc, then user_id asc.
+    Kept as a sorted list of (-value, user_id) keys so rank lookups are a
+    binary search, and top-N / windows are plain slices.
+    Thread-safe: updates may come from the background monitor thread.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        # user_id -> (value, username, photo)
+        self._entries: Dict[int, Tuple[int, Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+        # False until the first load(); callers fall back to the DB until then
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, rows):
+        """Replaces the contents with rows of (user_id, value, username, photo)."""
+        # Built outside the lock so a periodic reload doesn't stall readers; only the swap is locked
+        entries = {user_id: (value, username, photo) for user_id, value, username, photo in rows}
+        keys = sorted((-value, user_id) for user_id, (value, _, _) in entries.items())
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self.loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._keys = []
+            self._entries = {}
+
+    def update(self, user_id: int, value: int, username: Optional[str] = None, photo: Optional[str] = None):
+        """Sets a user's value. Values <= 0 remove the user from the board."""
+        with self._lock:
+            old = self._entries.get(user_id)
+            if old is not None:
+                i = bisect_left(self._keys, (-old[0], user_id))
+                del self._keys[i]
+                del self._entries[user_id]
+            if value > 0:
+                self._entries[user_id] = (value, username, photo)
+                insort(self._keys, (-value, user_id))
+
+    def get(self, user_id: int) -> Optional[int]:
+        entry = self._entries.get(user_id)
+        return entry[0] if entry else None
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based position of the user, or None if not on the board."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect_left(self._keys, (-entry[0], user_id)) + 1
+
+    def rank_for_value(self, value: int) -> int:
+        """1 + number of users with a strictly higher value."""
+        with self._lock:
+            return bisect_left(self._keys, (-value, -1)) + 1
+
+    def slice(self, start: int, stop: int) -> List[dict]:
+        """Entries at 0-based positions [start, stop), with their 1-based rank."""
+        with self._lock:
+            start = max(0, start)
+            return [
+                self._entry_dict(user_id, start + i + 1)
+                for i, (_, user_id) in enumerate(self._keys[start:stop])
+            ]
+
+    def top(self, n: int) -> List[dict]:
+        return self.slice(0, n)
+
+    def around(self, user_id: int, radius: int) -> List[dict]:
+        """Up to `radius` entries either side of the user (empty if not on the board)."""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        return self.slice(rank - 1 - radius, rank + radius)
+
+    def after(self, value: int, user_id: int, n: int) -> List[dict]:
+        """Keyset page: the n entries ranked strictly below (value, user_id)."""
+        with self._lock:
+            start = bisect_left(self._keys, (-value, user_id + 1))
+        return self.slice(start, start + n)
+
+    def _entry_dict(self, user_id: int, rank: int) -> dict:
+        value, username, photo = self._entries[user_id]
+        return {"id": user_id, "rank": rank, "value": value, "username": username, "photo": photo}
@@ -0,0 +1,175 @@
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from libs.logger import get_logger
+from libs.settings import settings
+
+logger = get_logger(__name__)
+
+# One append-only file per race: <REPLAY_DIR>/<race_id>.replay
+# Each record: server timestamp (float64), user_id (uint32, 0 = server), payload length (uint32),
+# followed by the compact JSON payload.
+RECORD_HEADER = struct.Struct("<dII")
+
+def replay_path(race_id: int) -> Path:
+    return Path(settings.REPLAY_DIR) / f"{race_id}.replay"
+
+class ReplayRecorder:
+    """
+    Writes relayed frames to per-race replay logs from a background thread.
+    The relay path only packs the record and does a non-blocking put; if the
+    bounded queue is full the frame is dropped (and counted) rather than stalling the loop.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=settings.REPLAY_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        # race_id -> open file (LRU, bounded by REPLAY_MAX_OPEN_FILES)
+        self._files: "OrderedDict[int, object]" = OrderedDict()
+        self.dropped = 0
+
+    def start(self):
+        if self._thread:
+            return
+        Path(settings.REPLAY_DIR).mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flushes pending records and closes all files."""
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def record(self, race_id: Optional[int], user_id: Optional[int], payload: bytes):
+        """Queues a frame already encoded as compact JSON (the relay's own payload, so it isn't encoded twice)."""
+        if not race_id or not self._thread:
+            return
+        record = RECORD_HEADER.pack(time.time(), user_id or 0, len(payload)) + payload
+        try:
+            self._queue.put_nowait((race_id, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def is_open(self, race_id: int) -> bool:
+        return race_id in self._files
+
+    def _file(self, race_id: int):
+        f = self._files.pop(race_id, None)
+        if f is None:
+            f = open(replay_path(race_id), "ab")
+            while len(self._files) >= settings.REPLAY_MAX_OPEN_FILES:
+                _, oldest = self._files.popitem(last=False)
+                oldest.close()
+        self._files[race_id] = f
+        return f
+
+    def _flush_all(self):
+        for f in self._files.values():
+            f.flush()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=settings.REPLAY_FLUSH_INTERVAL)
+            except queue.Empty:
+                # Quiet period: push buffered writes to disk
+                self._flush_all()
+                continue
+
+            if item is None:
+                break
+            race_id, record = item
+            try:
+                self._file(race_id).write(record)
+            except Exception as e:
+                logger.error(f"Error writing replay for race {race_id}: {e}")
+
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+def read_replay(race_id: int) -> Iterator[Tuple[float, int, dict]]:
+    """
+    Lazily yields (server_ts, user_id, message) from a race's replay log.
+    The file is memory-mapped, so memory use doesn't grow with race length.
+    A trailing partially-written record is ignored.
+    """
+    path = replay_path(race_id)
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        size = len(mm)
+        while offset + RECORD_HEADER.size <= size:
+            ts, user_id, length = RECORD_HEADER.unpack_from(mm, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > size:
+                break
+            yield ts, user_id, json.loads(mm[start:start + length])
+            offset = start + length
+
+def stream_replay(race_id: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """NDJSON chunks of a race's replay, for StreamingResponse."""
+    buffer = []
+    buffered = 0
+    for ts, user_id, message in read_replay(race_id):
+        line = json.dumps({"ts": ts, "user_id": user_id, "message": message}, separators=(",", ":")) + "\n"
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+def prune_replays() -> Tuple[int, int]:
+    """
+    Deletes replay logs older than REPLAY_RETENTION_DAYS, then the oldest ones until the
+    directory is under REPLAY_MAX_TOTAL_MB. Logs still being written are kept.
+    Returns (files removed, bytes freed).
+    """
+    files = []
+    for path in Path(settings.REPLAY_DIR).glob("*.replay"):
+        if path.stem.isdigit() and recorder.is_open(int(path.stem)):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    now = time.time()
+    max_age = settings.REPLAY_RETENTION_DAYS * 86400
+    max_bytes = settings.REPLAY_MAX_TOTAL_MB * 1024 * 1024
+    total = sum(size for _, size, _ in files)
+    removed = freed = 0
+    for mtime, size, path in files:
+        expired = max_age > 0 and now - mtime > max_age
+        over_cap = max_bytes > 0 and total > max_bytes
+        if not (expired or over_cap):
+            break # oldest first: everything after is newer
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+def replay_exists(race_id: int) -> bool:
+    return os.path.exists(replay_path(race_id))
+
+recorder = ReplayRecorder()
@@ -0,0 +1,106 @@
+import numpy as np
+from typing import Sequence, Tuple
+from libs.settings import settings
+
+# Server-side upper bound on what a race can score, mirroring the client's deterministic spawning:
+# - CollectibleSpawner rolls SeededRNG(`${seed}_col_${d}`).chance(collectibles.spawn.chance) every 25m
+# - DateSpawner rolls SeededRNG(`${seed}_date_${d}`).chance(dates.spawn.chance) every 30m
+# - RoadManager adds distance * player.scoreMultiplier, with speed ramping initial -> max
+# - each pickup adds its `points` (also for remote players' pickups in multiplayer)
+# Everything is vectorized over every spawn mark of every submission, so a batch costs a few numpy passes.
+
+COLLECTIBLE_GAP = 25  # CollectibleSpawner.svelte COLLECTIBLE_GAP
+DATES_GAP = 30        # DateSpawner.svelte SPAWN_INTERVAL
+
+MASK32 = np.uint64(0xFFFFFFFF)
+FNV_OFFSET = 0x811c9dc5
+FNV_PRIME = np.uint64(0x01000193)
+
+def _fnv1a(text: str) -> int:
+    """SeededRNG.hash for a plain string (used for the per-race prefix)."""
+    h = FNV_OFFSET
+    for ch in text:
+        h ^= ord(ch)
+        h = (h * 0x01000193) & 0xFFFFFFFF
+    return h
+
+POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+def _fnv1a_digits(h: np.ndarray, marks: np.ndarray) -> np.ndarray:
+    """Continues FNV-1a hashes `h` over the decimal digits of `marks` (elementwise)."""
+    num_digits = np.searchsorted(POW10, marks, side="right")
+    for pos in range(int(num_digits.max(initial=1))):
+        active = num_digits > pos
+        char = (48 + (marks // POW10[np.maximum(num_digits - 1 - pos, 0)]) % 10).astype(np.uint64)
+        h = np.where(active, ((h ^ char) * FNV_PRIME) & MASK32, h)
+    return h
+
+def _mulberry32_first(h: np.ndarray) -> np.ndarray:
+    """First SeededRNG.next() for each seed hash, in [0, 1)."""
+    t = (h + np.uint64(0x6D2B79F5)) & MASK32
+    t = ((t ^ (t >> np.uint64(15))) * (t | np.uint64(1))) & MASK32
+    t = t ^ ((t + (((t ^ (t >> np.uint64(7))) * (t | np.uint64(61))) & MASK32)) & MASK32)
+    return ((t ^ (t >> np.uint64(14))) & MASK32).astype(np.float64) / 4294967296.0
+
+def _spawns(seeds: Sequence[str], kind: str, gap: int, chance: float, limit: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (owner, mark) of every spawn at gap, 2*gap, ... strictly below each submission's `limit`.
+    One hash/RNG pass over all marks of all submissions.
+    """
+    per_race = np.maximum(np.ceil(limit / gap).astype(np.int64) - 1, 0)
+    total = int(per_race.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    owner = np.repeat(np.arange(len(seeds)), per_race)
+    starts = np.repeat(np.cumsum(per_race) - per_race, per_race)
+    marks = (np.arange(total) - starts + 1) * gap
+
+    prefixes = np.array([_fnv1a(f"{seed}_{kind}_") for seed in seeds], dtype=np.uint64)
+    spawned = _mulberry32_first(_fnv1a_digits(prefixes[owner], marks)) < chance
+    return owner[spawned], marks[spawned]
+
+def _count_below(owner: np.ndarray, marks: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    return np.bincount(owner[marks < limit[owner]], minlength=len(limit))
+
+def _base_distance(elapsed: np.ndarray) -> np.ndarray:
+    """Distance covered by the speed ramp (initial + increment/s, capped at max) after `elapsed` seconds."""
+    speed = settings.GAME_CONFIG["player"]["speed"]
+    v0, accel, vmax = speed["initial"], speed["increment"], speed["max"]
+    t_cap = (vmax - v0) / accel if accel > 0 else 0.0
+    ramp = np.minimum(elapsed, t_cap)
+    return v0 * ramp + 0.5 * accel * ramp ** 2 + vmax * np.maximum(elapsed - t_cap, 0)
+
+def max_scores(seeds: Sequence[str], elapsed: Sequence[float], players: Sequence[int]) -> np.ndarray:
+    """
+    Batch upper bound on the score attainable for each (seed, elapsed seconds, player count).
+    """
+    cfg = settings.GAME_CONFIG
+    nitro = cfg["player"]["nitro"]
+    elapsed = np.maximum(np.asarray(elapsed, dtype=np.float64), 0)
+    players = np.maximum(np.asarray(players, dtype=np.int64), 1)
+
+    base = _base_distance(elapsed)
+    # Loose bound: nitro boost held for the whole race
+    loose = base + nitro["speedBoost"] * elapsed
+
+    # Nitro needs `watermelonThreshold` watermelons per use, so it's bounded by what could spawn
+    col_owner, col_marks = _spawns(seeds, "col", COLLECTIBLE_GAP, cfg["collectibles"]["spawn"]["chance"], loose)
+    nitros = (players * _count_below(col_owner, col_marks, loose)) // max(nitro["watermelonThreshold"], 1)
+    nitro_time = np.minimum(elapsed, nitros * nitro["duration"] / 1000.0)
+    distance = base + nitro["speedBoost"] * nitro_time
+
+    col = _count_below(col_owner, col_marks, distance)
+    date_owner, date_marks = _spawns(seeds, "date", DATES_GAP, cfg["dates"]["spawn"]["chance"], distance)
+    dates = _count_below(date_owner, date_marks, distance)
+
+    return (
+        np.floor(distance * cfg["player"]["scoreMultiplier"])
+        + players * col * cfg["collectibles"]["points"]
+        + players * dates * cfg["dates"]["points"]
+    )
+
+def plausible_batch(scores: Sequence[int], seeds: Sequence[str], elapsed: Sequence[float], players: Sequence[int]) -> np.ndarray:
+    """Boolean mask of submissions within SCORE_PLAUSIBILITY_SLACK of the attainable maximum."""
+    limit = max_scores(seeds, elapsed, players) * settings.SCORE_PLAUSIBILITY_SLACK
+    return np.asarray(scores, dtype=np.float64) <= limit
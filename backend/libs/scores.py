@@ -0,0 +1,301 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+from database import models
+from libs import plausibility
+from libs.leaderboard_feed import feed
+from libs.logger import get_logger
+from libs.rank_index import RankIndex
+from libs.settings import settings
+
+logger = get_logger(__name__)
+
+# Global high-score board, kept in memory so rank, "around me" and deep pages
+# are a binary search + slice instead of COUNT / OFFSET scans over users.
+# Each instance keeps its own copy and reloads it every LEADERBOARD_RELOAD_INTERVAL
+# (libs.background_tasks), so scores submitted on other instances show up within that.
+leaderboard = RankIndex()
+
+# Locks the race's game rows before SUBMIT_SCORE_SQL runs. Under READ COMMITTED the next
+# statement takes a fresh snapshot, so it sees whatever a concurrent submission for the
+# same race committed while we waited: a retried submission of the same game finds its
+# own earlier score, and of two rivals finishing together the second sees the first.
+# (A FOR UPDATE CTE inside SUBMIT_SCORE_SQL can't do this: rows the statement's own
+# UPDATE touches first are skipped by the lock, and the other CTEs keep the old snapshot.)
+LOCK_RACE_GAMES_SQL = text("""
+SELECT id FROM games WHERE race_id = :race_id ORDER BY id FOR UPDATE
+""")
+
+# Everything else submit_score needs, in a single round-trip.
+# Data-modifying CTEs all run against the same snapshot, so:
+# - the game row is updated if it exists, otherwise inserted under (race_id, user_id)
+#   (fallback for missing records; a retry then finds and updates that row)
+# - the race is marked finished and the owning session ended
+# - the user's high score is bumped with GREATEST, which Postgres re-evaluates on the
+#   latest row version under lock, so two tabs submitting together can't lose an update
+# Re-sending the same submission leaves the rows in the same state (idempotent on retries).
+# Quarantined scores are stored on the game but never raise the user's high score.
+# :reset_score applies a pending daily challenge penalty in the same write.
+# user_stats is updated by the difference between this game's previous and new accepted score
+# (so retries don't double count): a game counts as played once it has an accepted score > 0,
+# and the highest accepted score in a multiplayer race holds the win (earlier finisher on ties).
+# Single player races also run in a session (max_players = 1), so only sessions for more than
+# one player count as multiplayer.
+# Taking the win from a rival moves it off their row in the same statement.
+SUBMIT_SCORE_SQL = text("""
+WITH prev AS (
+    SELECT g.score, g.quarantined, COALESCE(s.max_players > 1, false) AS multiplayer
+    FROM games g
+    LEFT JOIN multiplayer_sessions s ON s.id = g.multiplayer_session_id
+    WHERE g.race_id = :race_id AND g.user_id = :user_id
+    LIMIT 1
+),
+rival AS (
+    SELECT user_id, score
+    FROM games
+    WHERE race_id = :race_id AND user_id <> :user_id AND score > 0 AND NOT quarantined
+    ORDER BY score DESC, finished_at, id
+    LIMIT 1
+),
+standing AS (
+    SELECT
+        prev_score,
+        multiplayer,
+        rival_id,
+        multiplayer AND prev_score > COALESCE(rival_score, 0) AS was_leader,
+        multiplayer AND :accepted_score > COALESCE(rival_score, 0) AS is_leader
+    FROM (
+        SELECT
+            COALESCE((SELECT score FROM prev WHERE NOT quarantined), 0) AS prev_score,
+            COALESCE((SELECT multiplayer FROM prev), false) AS multiplayer,
+            (SELECT score FROM rival) AS rival_score,
+            (SELECT user_id FROM rival) AS rival_id
+    ) s
+),
+stats_upd AS (
+    INSERT INTO user_stats AS us (user_id, races_played, total_score, best_score, multiplayer_played, multiplayer_wins, last_played_at)
+    SELECT
+        :user_id,
+        (:accepted_score > 0)::int - (prev_score > 0)::int,
+        :accepted_score - prev_score,
+        :accepted_score,
+        CASE WHEN multiplayer THEN (:accepted_score > 0)::int - (prev_score > 0)::int ELSE 0 END,
+        is_leader::int - was_leader::int,
+        now()
+    FROM standing
+    ON CONFLICT (user_id) DO UPDATE SET
+        races_played = us.races_played + EXCLUDED.races_played,
+        total_score = us.total_score + EXCLUDED.total_score,
+        best_score = GREATEST(us.best_score, EXCLUDED.best_score),
+        multiplayer_played = us.multiplayer_played + EXCLUDED.multiplayer_played,
+        multiplayer_wins = us.multiplayer_wins + EXCLUDED.multiplayer_wins,
+        last_played_at = EXCLUDED.last_played_at
+    RETURNING us.user_id
+),
+rival_stats_upd AS (
+    UPDATE user_stats
+    SET multiplayer_wins = multiplayer_wins + CASE WHEN standing.is_leader THEN -1 ELSE 1 END
+    FROM standing
+    WHERE user_stats.user_id = standing.rival_id AND standing.is_leader <> standing.was_leader
+    RETURNING user_stats.user_id
+),
+game_upd AS (
+    UPDATE games
+    SET score = :score, quarantined = :quarantined, finished_at = now()
+    WHERE race_id = :race_id AND user_id = :user_id
+    RETURNING multiplayer_session_id
+),
+game_ins AS (
+    INSERT INTO games (user_id, race_id, car_index, score, quarantined, finished_at)
+    SELECT :user_id, :race_id, 0, :score, :quarantined, now()
+    WHERE NOT EXISTS (SELECT 1 FROM game_upd)
+),
+race_upd AS (
+    UPDATE races
+    SET status = 'finished'
+    WHERE id = :race_id
+    RETURNING id
+),
+session_upd AS (
+    UPDATE multiplayer_sessions
+    SET status = 'ended'
+    WHERE id IN (SELECT multiplayer_session_id FROM game_upd WHERE multiplayer_session_id IS NOT NULL)
+    RETURNING id
+),
+user_upd AS (
+    UPDATE users
+    SET score = GREATEST(CASE WHEN :reset_score THEN 0 ELSE COALESCE(score, 0) END, :accepted_score)
+    WHERE id = :user_id
+    RETURNING score
+)
+SELECT score FROM user_upd
+""")
+
+# The seed a race was generated from: its config's, or (races without one) its session's current seed,
+# which start_race and start_single_player set to the race's.
+RACE_SEED_EXPR = """COALESCE(r.config -> 'world' ->> 'seed', (
+    SELECT s.game_seed FROM games sg JOIN multiplayer_sessions s ON s.id = sg.multiplayer_session_id
+    WHERE sg.race_id = r.id LIMIT 1
+))"""
+
+RACE_PARAMS_SQL = text(f"""
+SELECT r.created_at, {RACE_SEED_EXPR}, (SELECT count(*) FROM games g WHERE g.race_id = r.id)
+FROM races r
+WHERE r.id = :race_id
+""")
+
+# Accepted scores finished in a window, with what the bound needs; one keyset chunk by games.id
+AUDIT_SCORES_SQL = text(f"""
+SELECT g.id, g.user_id, g.race_id, g.score,
+       EXTRACT(EPOCH FROM g.finished_at - r.created_at),
+       {RACE_SEED_EXPR},
+       (SELECT count(*) FROM games o WHERE o.race_id = g.race_id)
+FROM games g
+JOIN races r ON r.id = g.race_id
+WHERE g.id > :after_id AND g.finished_at >= :start AND g.finished_at < :end
+  AND g.score > 0 AND NOT g.quarantined
+ORDER BY g.id
+LIMIT :limit
+""")
+
+def is_plausible_score(db: Session, race_id: int, score: int) -> bool:
+    """
+    Checks a submission against the max attainable score for the race's seed and elapsed time.
+    Races created by this process are checked from memory; others (created elsewhere, or
+    evicted from the registry) are rebuilt from the race row and its session's seed.
+    Only races that don't exist can't be verified; they're treated as implausible.
+    """
+    if not settings.SCORE_PLAUSIBILITY_ENABLED or score <= 0:
+        return True
+
+    params = plausibility.races.get(race_id)
+    if params is None and race_id > 0:
+        row = db.execute(RACE_PARAMS_SQL, {"race_id": race_id}).first()
+        if row and row[0] and row[1]:
+            plausibility.races.register(race_id, row[1], row[2], row[0].timestamp())
+            params = plausibility.races.get(race_id)
+    if params is None:
+        logger.warning(f"Can't check score {score} for race {race_id}: race or seed not found")
+        return False
+
+    seed, started_at, players = params
+    return plausibility.is_plausible(score, seed, started_at, players)
+
+def audit_scores(db: Session, start: datetime, end: datetime) -> dict:
+    """
+    Re-checks accepted scores finished in [start, end) against the bound, e.g. after changing
+    SCORE_PLAUSIBILITY_SLACK or for games accepted while the check was off. Reads keyset chunks
+    of SCORE_AUDIT_BATCH_SIZE, each judged by one vectorized plausible_batch call.
+    Reports only: flagged games are not quarantined retroactively.
+    """
+    from libs.score_bounds import plausible_batch
+    checked, flagged, after_id = 0, [], 0
+    while True:
+        rows = db.execute(AUDIT_SCORES_SQL, {
+            "after_id": after_id, "start": start, "end": end, "limit": settings.SCORE_AUDIT_BATCH_SIZE
+        }).all()
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        rows = [row for row in rows if row[5]]
+        if rows:
+            ids, user_ids, race_ids, batch_scores, elapsed, seeds, players = zip(*rows)
+            plausible = plausible_batch(batch_scores, seeds, [float(e) for e in elapsed], players)
+            flagged += [
+                {"game_id": ids[i], "user_id": user_ids[i], "race_id": race_ids[i], "score": batch_scores[i]}
+                for i in range(len(rows)) if not plausible[i]
+            ]
+            checked += len(rows)
+    return {"checked": checked, "flagged": flagged}
+
+def submit_game_score(db: Session, user_id: int, race_id: int, score: int, quarantined: bool = False, reset_score: bool = False) -> int:
+    """
+    Records a finished game and returns the user's (possibly new) high score.
+    race_id must be a real race (> 0). Commits the transaction.
+    """
+    db.execute(LOCK_RACE_GAMES_SQL, {"race_id": race_id})
+    new_high_score = db.execute(SUBMIT_SCORE_SQL, {
+        "user_id": user_id,
+        "race_id": race_id,
+        "score": score,
+        "quarantined": quarantined,
+        "accepted_score": 0 if quarantined else score,
+        "reset_score": reset_score,
+    }).scalar()
+    db.commit()
+    return new_high_score or 0
+
+def load_leaderboard(db: Session):
+    """Rebuilds the in-memory high-score board from the DB. Called at startup and by the reloader."""
+    rows = db.query(
+        models.User.id,
+        models.User.score,
+        models.User.username,
+        models.User.profile_photo
+    ).filter(models.User.score > 0).all()
+    leaderboard.load(rows)
+
+def publish_high_score(user_id: int, username: str | None, score: int, photo: str | None):
+    """Applies a user's new high score (or a reset to 0) to the board and pushes it to live clients."""
+    leaderboard.update(user_id, score, username, photo)
+    feed.publish_score(user_id, username, score, photo)
+
+def format_entry(entry: dict) -> dict:
+    return {
+        "id": entry["id"],
+        "rank": entry["rank"],
+        "username": f"{entry['username']}#{entry['id']}",
+        "score": entry["value"],
+        "photo": entry["photo"]
+    }
+
+def game_history(db: Session, user_id: int, limit: int, before_finished_at: Optional[datetime] = None, before_id: Optional[int] = None) -> dict:
+    """
+    A page of the user's finished games, newest first, keyset-paginated on (finished_at, id)
+    (served by ix_games_user_finished_at_id, so cost is O(limit) however long the history).
+    finished_at is only set by a score submission, so joined-but-unplayed games are left out.
+    """
+    query = db.query(models.Game).filter(
+        models.Game.user_id == user_id,
+        models.Game.finished_at.isnot(None)
+    )
+    if before_finished_at is not None and before_id is not None:
+        query = query.filter(tuple_(models.Game.finished_at, models.Game.id) < tuple_(before_finished_at, before_id))
+    games = query.order_by(models.Game.finished_at.desc(), models.Game.id.desc()).limit(limit).all()
+
+    next_page = None
+    if len(games) == limit:
+        next_page = {"before_finished_at": games[-1].finished_at, "before_id": games[-1].id}
+    return {
+        "games": [
+            {
+                "id": g.id,
+                "race_id": g.race_id,
+                "session_id": g.multiplayer_session_id,
+                "score": g.score,
+                "quarantined": g.quarantined,
+                "assigned_lane": g.assigned_lane,
+                "finished_at": g.finished_at
+            }
+            for g in games
+        ],
+        "next": next_page
+    }
+
+def get_user_stats(db: Session, user_id: int) -> dict:
+    """The user's rollup row (one primary key lookup)."""
+    stats = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).first()
+    if not stats:
+        return {
+            "races_played": 0, "best_score": 0, "average_score": 0,
+            "multiplayer_played": 0, "multiplayer_wins": 0, "last_played_at": None
+        }
+    return {
+        "races_played": stats.races_played,
+        "best_score": stats.best_score,
+        "average_score": round(stats.total_score / stats.races_played) if stats.races_played else 0,
+        "multiplayer_played": stats.multiplayer_played,
+        "multiplayer_wins": stats.multiplayer_wins,
+        "last_played_at": stats.last_played_at
+    }
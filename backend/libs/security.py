@@ -1,26 +1,35 @@
 from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from database import models, database
 from libs.settings import settings
+from libs.profiling import span
 
 # Secret key to sign JWTs
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+_pwd_context = None
+
+def _get_pwd_context():
+    # passlib/bcrypt are only needed if passwords are ever used (~40ms of import time otherwise)
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -33,11 +42,29 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_resume_token(user_id: int, session_id: str, race_id: Optional[int], large: bool) -> str:
+    """Short-lived token handed out when draining: lets the player rejoin the session on another instance without DB lookups."""
+    return create_access_token(
+        data={"sub": str(user_id), "resume": session_id, "race_id": race_id, "large": large},
+        expires_delta=timedelta(seconds=settings.DRAIN_RESUME_TOKEN_TTL)
+    )
+
+def decode_resume_token(token: str, session_id: str) -> Optional[dict]:
+    """The resume token's claims if it is valid for this session, else None."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("resume") != session_id or not str(payload.get("sub", "")).isdigit():
+        return None
+    return payload
+
 def get_user_from_token(token: str, db: Session) -> Optional[models.User]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        # Resume tokens only work for rejoining their session
+        if user_id is None or "resume" in payload:
             return None
     except JWTError:
         return None
@@ -45,13 +72,26 @@ def get_user_from_token(token: str, db: Session) -> Optional[models.User]:
     user = db.query(models.User).filter(models.User.id == int(user_id)).first()
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    user = get_user_from_token(token, db)
+def _authenticate(token: str, db: Session) -> models.User:
+    with span("auth"):
+        user = get_user_from_token(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    return _authenticate(token, db)
+
+async def get_current_read_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_read_db)):
+    """Same as get_current_user, but loads the user from the read replica (for read-only routes)."""
+    return _authenticate(token, db)
+
+async def get_current_admin(current_user: models.User = Depends(get_current_read_user)):
+    """Users listed in ADMIN_USER_IDS only."""
+    if current_user.id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
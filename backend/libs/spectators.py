@@ -0,0 +1,92 @@
+import asyncio
+from typing import Dict, Optional, Set
+from fastapi import WebSocket
+from libs.logger import get_logger
+from libs.settings import settings
+
+logger = get_logger(__name__)
+
+class Spectator:
+    """
+    One read-only viewer. Frames go through a bounded queue drained by its own writer task,
+    so a slow viewer only ever falls behind itself: when the queue is full the oldest
+    (stalest) frame is dropped to make room.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SPECTATOR_QUEUE_SIZE)
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def offer(self, payload: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    async def _run(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                await self.websocket.send_text(payload)
+            except Exception:
+                # Receive loop in the endpoint notices the disconnect and removes us
+                return
+
+class SpectatorHub:
+    """
+    Spectators per session, counted separately from player capacity.
+    publish() takes an already-encoded frame and never awaits, so relaying to
+    hundreds of viewers doesn't slow down the racers' broadcast.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, Set[Spectator]] = {}
+
+    def count(self, session_id: str) -> int:
+        return len(self.sessions.get(session_id, ()))
+
+    def is_full(self, session_id: str) -> bool:
+        return self.count(session_id) >= settings.SPECTATOR_MAX_PER_SESSION
+
+    def add(self, session_id: str, websocket: WebSocket, snapshot: str) -> Spectator:
+        spectator = Spectator(websocket)
+        spectator.offer(snapshot)
+        spectator.start()
+        self.sessions.setdefault(session_id, set()).add(spectator)
+        logger.info(f"Spectator joined session {session_id} ({self.count(session_id)} watching)")
+        return spectator
+
+    def remove(self, session_id: str, spectator: Spectator):
+        spectator.stop()
+        viewers = self.sessions.get(session_id)
+        if viewers is not None:
+            viewers.discard(spectator)
+            if not viewers:
+                del self.sessions[session_id]
+
+    def has_viewers(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def publish(self, session_id: str, payload: str):
+        for spectator in self.sessions.get(session_id, ()):
+            spectator.offer(payload)
+
+    def stats(self, session_id: str) -> dict:
+        viewers = self.sessions.get(session_id, ())
+        return {
+            "spectators": len(viewers),
+            "dropped": sum(s.dropped for s in viewers),
+            "max_spectators": settings.SPECTATOR_MAX_PER_SESSION
+        }
+
+hub = SpectatorHub()
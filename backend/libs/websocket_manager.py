@@ -1,25 +1,172 @@
 from fastapi import WebSocket
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Optional
+from collections import deque
+import asyncio
+import heapq
 import json
+import time
 from libs.logger import get_logger
+from libs.settings import settings
+from libs import replay, spectators
+from libs.ws_rate_limit import InboundLimiter
 
 logger = get_logger(__name__)
 
+_clock_origin = time.monotonic()
+
+def server_time_ms() -> float:
+    """Monotonic server clock (ms) stamped on relayed frames and used for time sync."""
+    return round((time.monotonic() - _clock_origin) * 1000, 1)
+
+class SessionJournal:
+    """
+    Bounded ring buffer of recent broadcast events for one session, plus a compact
+    latest-state snapshot, so a reconnecting client can catch up from memory.
+    """
+
+    def __init__(self, maxlen: int):
+        self.seq = 0
+        self.events: deque = deque(maxlen=maxlen)
+        # user_id -> latest known state (lane, distance, crashed, ...)
+        self.players: Dict[str, dict] = {}
+        # Most recent game_start, so late joiners get config/seed/lanes even if it left the buffer
+        self.game_start: Optional[dict] = None
+        # Race currently being played in this session (replay log target)
+        self.race_id: Optional[int] = None
+        self.last_activity = time.monotonic()
+
+    def record(self, message: dict) -> int:
+        self.seq += 1
+        message["seq"] = self.seq
+        message["server_ts"] = server_time_ms()
+        self.events.append(message)
+        self.last_activity = time.monotonic()
+
+        msg_type = message.get("type")
+        if msg_type == "game_start":
+            self.game_start = message
+            self.race_id = message.get("race_id")
+            self.players = {}
+        elif msg_type == "player_disconnected":
+            self.players.setdefault(str(message.get("id")), {})["connected"] = False
+        elif "user_id" in message:
+            state = self.players.setdefault(str(message["user_id"]), {})
+            state["connected"] = True
+            if msg_type == "move":
+                state["lane"] = message.get("lane")
+                state["distance"] = message.get("distance")
+            elif msg_type == "crash":
+                state["crashed"] = True
+                state["score"] = message.get("score")
+        return self.seq
+
+    def catch_up(self, last_seq: int) -> dict:
+        """
+        Events after last_seq. complete=False means some were already evicted, or last_seq
+        comes from an earlier journal (process restart); rely on the snapshot.
+        """
+        oldest = self.events[0]["seq"] if self.events else self.seq + 1
+        return {
+            "type": "resync",
+            "seq": self.seq,
+            "complete": last_seq + 1 >= oldest and last_seq <= self.seq,
+            "events": [e for e in self.events if e["seq"] > last_seq],
+            "state": {
+                "players": self.players,
+                "game_start": self.game_start
+            }
+        }
+
+class Heartbeat:
+    """
+    Server-initiated ping for one connection. Clients answer with {"type": "pong", "ts": <ping ts>}
+    (any inbound frame counts as activity); connections silent for WS_IDLE_TIMEOUT are closed.
+    Echoed ping timestamps give per-connection RTT statistics.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.last_seen = time.monotonic()
+        self.rtt_last: Optional[float] = None
+        self.rtt_avg: Optional[float] = None
+        self.rtt_min: Optional[float] = None
+        self.rtt_max: Optional[float] = None
+        self.rtt_samples = 0
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def on_pong(self, message: dict):
+        ts = message.get("ts")
+        if not isinstance(ts, (int, float)):
+            return
+        rtt = round(server_time_ms() - ts, 1)
+        if rtt < 0 or rtt > settings.WS_IDLE_TIMEOUT * 1000:
+            return
+        self.rtt_last = rtt
+        # Exponentially weighted, like TCP's SRTT
+        self.rtt_avg = rtt if self.rtt_avg is None else 0.875 * self.rtt_avg + 0.125 * rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+        self.rtt_samples += 1
+
+    def stats(self) -> dict:
+        return {
+            "rtt_last_ms": self.rtt_last,
+            "rtt_avg_ms": round(self.rtt_avg, 1) if self.rtt_avg is not None else None,
+            "rtt_min_ms": self.rtt_min,
+            "rtt_max_ms": self.rtt_max,
+            "rtt_samples": self.rtt_samples
+        }
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL)
+            if time.monotonic() - self.last_seen > settings.WS_IDLE_TIMEOUT:
+                logger.info("Closing idle WebSocket connection")
+                await self._close(4008, "Idle timeout")
+                return
+            try:
+                await self.websocket.send_json({"type": "ping", "ts": server_time_ms()})
+            except Exception:
+                await self._close(1011, "Ping failed")
+                return
+
+    async def _close(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
 class ConnectionManager:
     def __init__(self):
         # session_id -> list of websockets
         self.active_connections: Dict[str, List[WebSocket]] = {}
         # session_id -> game state / config (optional cache)
         self.session_states: Dict[str, dict] = {}
+        # session_id -> recent events for reconnect resync
+        self.journals: Dict[str, SessionJournal] = {}
+        # session_id -> user_id -> (inbound limiter, heartbeat) for per-client counters and RTT
+        self.clients: Dict[str, Dict[int, tuple]] = {}
+        # websocket -> user_id (interest management needs to know whose socket is whose)
+        self.connection_users: Dict[WebSocket, int] = {}
+        # Sessions in large-lobby mode -> their position summary task
+        self.large_sessions: Dict[str, Optional[asyncio.Task]] = {}
 
-    async def connect(self, websocket: WebSocket, session_id: str):
+    async def connect(self, websocket: WebSocket, session_id: str, user_id: Optional[int] = None):
         await websocket.accept()
         if session_id not in self.active_connections:
             self.active_connections[session_id] = []
         self.active_connections[session_id].append(websocket)
+        if user_id is not None:
+            self.connection_users[websocket] = user_id
+        if session_id in self.large_sessions:
+            self._ensure_summaries(session_id)
+        self._expire_journals()
         logger.info(f"Client connected to session {session_id}")
 
     def disconnect(self, websocket: WebSocket, session_id: str):
+        self.connection_users.pop(websocket, None)
         if session_id in self.active_connections:
             if websocket in self.active_connections[session_id]:
                 self.active_connections[session_id].remove(websocket)
@@ -27,13 +174,141 @@ class ConnectionManager:
                     del self.active_connections[session_id]
             logger.info(f"Client disconnected from session {session_id}")
 
+    def set_large(self, session_id: str, large: bool):
+        """
+        Large-lobby mode: moves go full-rate only to the nearest rivals (by distance),
+        everyone else gets a low-rate positions summary.
+        """
+        if large:
+            self.large_sessions.setdefault(session_id, None)
+            self._ensure_summaries(session_id)
+        else:
+            task = self.large_sessions.pop(session_id, None)
+            if task:
+                task.cancel()
+
+    def _ensure_summaries(self, session_id: str):
+        task = self.large_sessions.get(session_id)
+        if (task is None or task.done()) and session_id in self.active_connections:
+            self.large_sessions[session_id] = asyncio.create_task(self._summary_loop(session_id))
+
+    async def _summary_loop(self, session_id: str):
+        while session_id in self.active_connections and session_id in self.large_sessions:
+            await asyncio.sleep(settings.LARGE_LOBBY_SUMMARY_INTERVAL)
+            journal = self.journals.get(session_id)
+            if not journal or not journal.players:
+                continue
+            payload = json.dumps({
+                "type": "positions",
+                "server_ts": server_time_ms(),
+                "players": {
+                    user_id: {"lane": state.get("lane"), "distance": state.get("distance")}
+                    for user_id, state in journal.players.items()
+                    if state.get("connected", True) and "distance" in state
+                }
+            })
+            spectators.hub.publish(session_id, payload)
+            await self._send(session_id, list(self.active_connections.get(session_id, [])), payload)
+
+    def track_client(self, session_id: str, user_id: int, limiter: InboundLimiter, heartbeat: Heartbeat):
+        self.clients.setdefault(session_id, {})[user_id] = (limiter, heartbeat)
+
+    def untrack_client(self, session_id: str, user_id: int, limiter: InboundLimiter):
+        limiter.close()
+        session_clients = self.clients.get(session_id, {})
+        if user_id in session_clients and session_clients[user_id][0] is limiter:
+            del session_clients[user_id]
+            if not session_clients:
+                del self.clients[session_id]
+
+    def client_stats(self, session_id: str) -> Dict[int, dict]:
+        return {
+            user_id: {**limiter.stats(), **heartbeat.stats()}
+            for user_id, (limiter, heartbeat) in self.clients.get(session_id, {}).items()
+        }
+
+    def journal(self, session_id: str) -> SessionJournal:
+        if session_id not in self.journals:
+            self.journals[session_id] = SessionJournal(settings.SESSION_JOURNAL_SIZE)
+        return self.journals[session_id]
+
+    async def send_resync(self, websocket: WebSocket, session_id: str, last_seq: int):
+        """Sends everything the client missed since last_seq, straight from memory."""
+        await websocket.send_json(self.journal(session_id).catch_up(last_seq))
+
+    def _expire_journals(self):
+        # Journals outlive their connections (so the last player can still resync),
+        # but are dropped once a session has been idle for SESSION_JOURNAL_TTL.
+        cutoff = time.monotonic() - settings.SESSION_JOURNAL_TTL
+        for session_id in [s for s, j in self.journals.items() if j.last_activity < cutoff]:
+            if session_id not in self.active_connections:
+                del self.journals[session_id]
+
+    def _recipients(self, session_id: str, message: dict, exclude: Optional[WebSocket]) -> List[WebSocket]:
+        connections = [c for c in self.active_connections.get(session_id, []) if c != exclude]
+        if session_id not in self.large_sessions or message.get("type") != "move":
+            return connections
+
+        # Interest management: only the closest rivals within the distance window get this move
+        distance = message.get("distance")
+        if not isinstance(distance, (int, float)):
+            return []
+        players = self.journals[session_id].players
+        nearby = []
+        for connection in connections:
+            state = players.get(str(self.connection_users.get(connection)), {})
+            gap = abs((state.get("distance") or 0) - distance)
+            if gap <= settings.LARGE_LOBBY_INTEREST_DISTANCE:
+                nearby.append((gap, id(connection), connection))
+        return [c for _, _, c in heapq.nsmallest(settings.LARGE_LOBBY_MAX_NEIGHBOURS, nearby)]
+
+    async def _send_one(self, connection: WebSocket, payload: str) -> bool:
+        try:
+            await asyncio.wait_for(connection.send_text(payload), settings.WS_SEND_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Client too slow to take a frame, evicting")
+            # Half-written frame: the socket is unusable now; the client reconnects and resyncs.
+            # Don't wait on the close either.
+            asyncio.create_task(self._close(connection))
+            return False
+        except Exception as e:
+            logger.error(f"Error broadcasting to client, evicting: {e}")
+            return False
+
+    async def _close(self, connection: WebSocket):
+        try:
+            await asyncio.wait_for(connection.close(code=1013, reason="Too slow"), settings.WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _send(self, session_id: str, recipients: List[WebSocket], payload: str):
+        # Concurrently, each send bounded by WS_SEND_TIMEOUT: one slow socket can't hold up the lobby
+        if len(recipients) == 1:
+            sent = [await self._send_one(recipients[0], payload)]
+        else:
+            sent = await asyncio.gather(*(self._send_one(c, payload) for c in recipients))
+        # Don't keep paying for half-open or stalled sockets on every broadcast
+        for connection, ok in zip(recipients, sent):
+            if not ok:
+                self.disconnect(connection, session_id)
+
     async def broadcast(self, message: dict, session_id: str, exclude: WebSocket = None):
-        if session_id in self.active_connections:
-            for connection in self.active_connections[session_id]:
-                if connection != exclude:
-                    try:
-                        await connection.send_json(message)
-                    except Exception as e:
-                        logger.error(f"Error broadcasting to client: {e}")
+        journal = self.journal(session_id)
+        journal.record(message)
+        # Encode once for the replay log and all recipients (players and spectators)
+        payload = json.dumps(message, separators=(",", ":"))
+        replay.recorder.record(journal.race_id, message.get("user_id"), payload.encode())
+        recipients = self._recipients(session_id, message, exclude)
+        # Large lobbies: spectators follow moves through the positions summary instead
+        watched = spectators.hub.has_viewers(session_id) and not (
+            session_id in self.large_sessions and message.get("type") == "move"
+        )
+        if not (recipients or watched):
+            return
+        if watched:
+            spectators.hub.publish(session_id, payload)
+        if recipients:
+            await self._send(session_id, recipients, payload)
 
 manager = ConnectionManager()
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from libs.settings import settings
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def take_up_to(self, amount: int) -> int:
+        """Takes as many whole tokens as available, up to amount. Returns how many were taken."""
+        self._refill()
+        taken = min(amount, int(self.tokens))
+        self.tokens -= taken
+        return taken
+
+    def time_until(self, amount: float = 1) -> float:
+        self._refill()
+        if self.tokens >= amount or self.rate <= 0:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+def _collect_rate() -> float:
+    # Pickups can't legitimately arrive faster than dates + watermelons spawn
+    cfg = settings.GAME_CONFIG
+    return 1000 / cfg["dates"]["spawn"]["interval"] + 1000 / cfg["collectibles"]["spawn"]["interval"]
+
+class InboundLimiter:
+    """
+    Per-connection budgets for inbound WebSocket frames.
+    - move: token bucket; excess frames are coalesced so only the latest is relayed once a token frees up
+    - collect: `amount` is capped by a bucket refilled at the configured spawn rates
+    - anything else: shared token bucket, excess dropped
+    """
+
+    def __init__(self):
+        self.move_bucket = TokenBucket(settings.WS_MOVE_RATE, settings.WS_MOVE_BURST)
+        self.collect_bucket = TokenBucket(_collect_rate(), settings.WS_COLLECT_BURST)
+        self.default_bucket = TokenBucket(settings.WS_DEFAULT_RATE, settings.WS_DEFAULT_BURST)
+        self.pending_move: Optional[dict] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.relayed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.capped = 0
+
+    def admit(self, message: dict) -> Optional[dict]:
+        """Returns the message to relay now, or None if it was dropped or deferred."""
+        msg_type = message.get("type")
+
+        if msg_type == "move":
+            if self.pending_move is None and self.move_bucket.take():
+                self.relayed += 1
+                return message
+            if self.pending_move is not None:
+                self.coalesced += 1
+            self.pending_move = message
+            return None
+
+        if msg_type == "collect":
+            requested = message.get("amount", 1)
+            if isinstance(requested, bool) or not isinstance(requested, int) or requested < 1:
+                requested = 1
+            allowed = self.collect_bucket.take_up_to(requested)
+            if allowed == 0:
+                self.dropped += 1
+                return None
+            if allowed < requested:
+                self.capped += 1
+            message["amount"] = allowed
+            self.relayed += 1
+            return message
+
+        if self.default_bucket.take():
+            self.relayed += 1
+            return message
+        self.dropped += 1
+        return None
+
+    def schedule_flush(self, relay: Callable[[dict], Awaitable[None]]):
+        """Relays the pending (latest) move as soon as the move budget allows."""
+        if self.pending_move is not None and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush(relay))
+
+    async def _flush(self, relay: Callable[[dict], Awaitable[None]]):
+        try:
+            # Moves deferred while relaying are picked up by this same task
+            while self.pending_move is not None:
+                while not self.move_bucket.take():
+                    await asyncio.sleep(self.move_bucket.time_until())
+                message, self.pending_move = self.pending_move, None
+                if message is not None:
+                    self.relayed += 1
+                    await relay(message)
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "relayed": self.relayed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "capped": self.capped
+        }
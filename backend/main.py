@@ -1,31 +1,77 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from routes import auth, game
+import importlib
+import threading
+from routes import auth, game, admin
 from database import models
-from libs.logger import setup_logging, shutdown_logging
+from libs.logger import setup_logging, shutdown_logging, get_logger, log_stats
 from libs.settings import settings
-from libs.background_tasks import start_challenge_monitor
+from libs.background_tasks import start_challenge_monitor, start_lobby_reaper, start_leaderboard_reloader
+from libs.leaderboard_feed import feed as leaderboard_feed
+from libs.replay import recorder as replay_recorder
+from libs.matchmaking import matchmaker
+from libs.admission import AdmissionMiddleware, controller as admission
+from libs.profiling import ServerTimingMiddleware, TimedJSONResponse, watchdog
+from libs.drain import drainer
+
+logger = get_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_logging()
     
     # Debug: Print current time and challenge status
-    from libs import daily_challenge
+    from libs import daily_challenge, scores
     from datetime import datetime, timedelta
     now_maldives = datetime.utcnow() + timedelta(hours=5)
-    print(f"DEBUG: Server UTC Time: {datetime.utcnow()}")
-    print(f"DEBUG: Maldives Time: {now_maldives}")
-    print(f"DEBUG: Challenge Date: {daily_challenge.get_today_challenge_date()}")
-    print(f"DEBUG: Start Hour: {daily_challenge.CHALLENGE_START_HOUR}, End Hour: {daily_challenge.CHALLENGE_END_HOUR}")
+    logger.info(f"Server UTC Time: {datetime.utcnow()}")
+    logger.info(f"Maldives Time: {now_maldives}")
+    logger.info(f"Challenge Date: {daily_challenge.get_today_challenge_date()}")
+    logger.info(f"Start Hour: {daily_challenge.CHALLENGE_START_HOUR}, End Hour: {daily_challenge.CHALLENGE_END_HOUR}")
+    
+    # Rebuild the in-memory leaderboards before serving
+    from database.database import SessionLocal
+    db = SessionLocal()
+    try:
+        daily_challenge.load_daily_leaderboard(db)
+        scores.load_leaderboard(db)
+    finally:
+        db.close()
     
     start_challenge_monitor()
-    print("started challenge monitor")
+    logger.info("started challenge monitor")
+    start_lobby_reaper()
+    start_leaderboard_reloader()
+    leaderboard_feed.start()
+    replay_recorder.start()
+    matchmaker.start()
+    admission.start()
+    if settings.LOOP_WATCHDOG_ENABLED:
+        watchdog.start()
+    # SIGTERM hands players off before the server starts closing sockets
+    drainer.install_signal_handler()
+    # Deferred at import time to keep startup fast; warm it in the background
+    # so the first score submission doesn't pay for importing numpy.
+    threading.Thread(target=importlib.import_module, args=("libs.score_bounds",), daemon=True).start()
     yield
+    # Then flush what's buffered: replay logs, pending leaderboard deltas, log records
+    await drainer.stop()
+    watchdog.stop()
+    await admission.stop()
+    await matchmaker.stop()
+    await leaderboard_feed.stop()
+    replay_recorder.stop()
     shutdown_logging()
 
-app = FastAPI(title="Dash Multiplayer Backend", lifespan=lifespan)
+app = FastAPI(title="Dash Multiplayer Backend", lifespan=lifespan, default_response_class=TimedJSONResponse)
+
+# Innermost, so its total covers only admitted requests
+app.add_middleware(ServerTimingMiddleware)
+
+# Added before CORS so CORS wraps it: shed responses still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,15 +83,31 @@ app.add_middleware(
 
 app.include_router(auth.router, prefix="/api")
 app.include_router(game.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.get("/health")
 async def health_check():
+    # 503 while draining so the load balancer stops sending new clients here
+    if drainer.draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
     return {"status": "healthy"}
 
+@app.get("/health/admission")
+async def admission_metrics():
+    # Shedding decisions (by reason and route), in-flight requests, loop lag and DB pool usage
+    return admission.metrics()
+
+@app.get("/health/logging")
+async def logging_metrics():
+    # Log records dropped (full queue) and suppressed (per call site rate limit)
+    return log_stats()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Dash Multiplayer Backend"}
 
 if __name__ == "__main__":
     import uvicorn
+    # Single worker: lobbies, journals, matchmaking, spectators and the feeds live in this
+    # process, so a second worker would split sessions between processes
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
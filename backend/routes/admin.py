@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from datetime import datetime
+from sqlalchemy.orm import Session
+from database import database
+from libs import security, profiling, export, scores
+from libs.drain import drainer
+from libs.settings import settings
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(security.get_current_admin)])
+
+@router.get("/profiling")
+async def get_profiling_status():
+    return {
+        "server_timing": profiling.server_timing_enabled,
+        "profiler_running": profiling.profiler.running,
+        "loop_watchdog": profiling.watchdog.enabled,
+        "loop_block_threshold_ms": round(profiling.watchdog.threshold * 1000),
+        "loop_blocked": profiling.watchdog.blocked
+    }
+
+@router.post("/profiling/profile")
+async def run_profile(
+    seconds: float = Query(10, gt=0, le=settings.PROFILER_MAX_SECONDS),
+    format: str = Query("collapsed", pattern="^(collapsed|svg)$")
+):
+    # Samples every thread (event loop included) for `seconds`
+    stacks = await profiling.profiler.profile(seconds)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    if format == "svg":
+        return Response(
+            profiling.flamegraph_svg(stacks),
+            media_type="image/svg+xml",
+            headers={"Content-Disposition": 'attachment; filename="flamegraph.svg"'}
+        )
+    return PlainTextResponse(profiling.collapsed(stacks))
+
+@router.post("/profiling/server-timing")
+async def set_server_timing(enabled: bool):
+    profiling.server_timing_enabled = enabled
+    return {"server_timing": enabled}
+
+@router.post("/profiling/loop-watchdog")
+async def set_loop_watchdog(enabled: bool, threshold_ms: int = Query(None, ge=10, le=10000)):
+    if threshold_ms is not None:
+        profiling.watchdog.threshold = threshold_ms / 1000
+    if enabled:
+        profiling.watchdog.start()
+    else:
+        profiling.watchdog.stop()
+    return {"loop_watchdog": profiling.watchdog.enabled, "loop_block_threshold_ms": round(profiling.watchdog.threshold * 1000)}
+
+@router.get("/export/games")
+async def export_games(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: datetime | None = None,
+    end: datetime | None = None,
+    session_id: int | None = None,
+    gzip: bool = False
+):
+    # Sync generator: StreamingResponse runs it in the threadpool, chunk by chunk
+    filename = f"games.{format}" + (".gz" if gzip else "")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export.export(format, start, end, session_id, gzip),
+        media_type="application/gzip" if gzip else media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/audit/scores")
+def audit_scores(start: datetime, end: datetime, db: Session = Depends(database.get_read_db)):
+    # Sync route (threadpool): evaluating the bound for a large window is CPU work
+    return scores.audit_scores(db, start, end)
+
+@router.get("/drain")
+async def get_drain_status():
+    return drainer.status()
+
+@router.post("/drain")
+async def start_drain():
+    # Same as SIGTERM without the exit: hands players off and stops taking new sessions
+    drainer.start()
+    return drainer.status()
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from database import database, models
-from libs import security
+from libs import security, scores, daily_challenge
+from libs.logger import get_logger
 from libs.settings import settings
 from pydantic import BaseModel
-import httpx
 import uuid
 
+logger = get_logger(__name__)
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 class ZitadelLoginRequest(BaseModel):
@@ -24,6 +26,8 @@ class UserResponse(BaseModel):
 
 def get_user_rank(db: Session, user_id: int, score: int) -> int:
     # Rank is 1 + count of *non-guest* users with strictly higher score
+    if scores.leaderboard.loaded:
+        return scores.leaderboard.rank_for_value(score)
     higher_scores = db.query(models.User).filter(
         models.User.score > score
     ).count()
@@ -76,10 +80,12 @@ async def zitadel_login(request: ZitadelLoginRequest, db: Session = Depends(data
         "grant_type": "authorization_code"
     }
     
+    # Only Zitadel logins need an HTTP client; imported here to keep startup fast
+    import httpx
     async with httpx.AsyncClient() as client:
         response = await client.post(token_url, data=data)
         if response.status_code != 200:
-             print(f"Token Exchange Failed: {response.text}")
+             logger.warning(f"Token Exchange Failed: HTTP {response.status_code}")
              raise HTTPException(status_code=400, detail="Invalid Zitadel Code")
         token_data = response.json()
         access_token = token_data.get("access_token")
@@ -91,9 +97,6 @@ async def zitadel_login(request: ZitadelLoginRequest, db: Session = Depends(data
             raise HTTPException(status_code=400, detail="Failed to get user info")
         user_info = user_info_response.json()
         
-        # Zitadel UserInfo fields
-        print(f"DEBUG: Zitadel UserInfo: {user_info}")
-        
         email = user_info.get("email")
         if not email:
             raise HTTPException(status_code=400, detail="Identity provider did not return an email address.")
@@ -127,7 +130,7 @@ async def zitadel_login(request: ZitadelLoginRequest, db: Session = Depends(data
             db.add(user)
             db.commit()
             db.refresh(user)
-            print(f"DEBUG: Created new user {user.username} ({user.email})")
+            logger.info(f"Created new user {user.id}")
         else:
             # Update profile photo and ensuring consistency
             updated = False
@@ -144,19 +147,20 @@ async def zitadel_login(request: ZitadelLoginRequest, db: Session = Depends(data
             if updated:
                 db.commit()
                 db.refresh(user)
-            print(f"DEBUG: Logged in existing user {user.username} ({user.email})")
+            logger.debug(f"Logged in existing user {user.id}")
         
         # Create JWT
         access_token = security.create_access_token(data={"sub": str(user.id)})
         
-        rank = get_user_rank(db, user.id, user.score)
+        score = daily_challenge.effective_user_score(user)
+        rank = get_user_rank(db, user.id, score)
         
         return {
             "id": user.id,
             "username": f"{user.username}#{user.id}",
             "email": user.email,
             "profile_photo": user.profile_photo,
-            "score": user.score,
+            "score": score,
             "access_token": access_token,
             "is_guest": user.is_guest,
             "rank": rank
@@ -173,9 +177,14 @@ async def update_username(request: UsernameUpdateRequest, current_user: models.U
     #     raise HTTPException(status_code=400, detail="Username taken")
         
     current_user.username = request.username
+    penalized = daily_challenge.apply_pending_penalty(current_user)
     db.commit()
     db.refresh(current_user)
     
+    # Keep the leaderboard name in sync
+    if current_user.score or penalized:
+        scores.publish_high_score(current_user.id, current_user.username, current_user.score, current_user.profile_photo)
+    
     # Re-issue token? Not strictly necessary if token checks ID.
     access_token = security.create_access_token(data={"sub": str(current_user.id)})
 
@@ -199,22 +208,19 @@ async def get_auth_config():
         "client_id": settings.ZITADEL_CLIENT_ID,
     }
 
-from libs import daily_challenge
-
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
-    # Check for daily challenge penalties
-    daily_challenge.check_and_apply_penalty(db, current_user)
-    
-    rank = None
-    rank = get_user_rank(db, current_user.id, current_user.score)
+async def get_me(current_user: models.User = Depends(security.get_current_read_user), read_db: Session = Depends(database.get_read_db)):
+    # Daily challenge penalty is evaluated, not written: the stored score is zeroed
+    # by the next write to the row or the daily bulk job
+    score = daily_challenge.effective_user_score(current_user)
+    rank = get_user_rank(read_db, current_user.id, score)
         
     return {
             "id": current_user.id,
             "username": f"{current_user.username}#{current_user.id}",
             "email": current_user.email,
             "profile_photo": current_user.profile_photo,
-            "score": current_user.score,
+            "score": score,
             "access_token": "", # Not needed for verification check endpoint usually
             "is_guest": current_user.is_guest,
             "rank": rank
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
 from database import database, models
-from libs import security, websocket_manager, daily_challenge
+from libs import security, websocket_manager, daily_challenge, scores, leaderboard_feed, replay, plausibility, ws_rate_limit, spectators, race_setup, matchmaking, admission, drain
+from libs.logger import get_logger
 from libs.settings import settings
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from datetime import datetime
+import asyncio
 import random
 import uuid
 import json
 
 router = APIRouter(prefix="/game", tags=["game"])
+logger = get_logger(__name__)
 
 @router.get("/config")
 async def get_game_config():
@@ -19,7 +24,7 @@ async def get_game_config():
     config["world"]["seed"] = str(uuid.uuid4())
     return config
 
-@router.post("/start/single")
+@router.post("/start/single", dependencies=[Depends(drain.refuse_new_sessions)])
 async def start_single_player(config: dict = None, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
     # Use provided config or default
     if not config or not config.get("world"):
@@ -51,6 +56,7 @@ async def start_single_player(config: dict = None, current_user: models.User = D
     db.add(race)
     db.commit()
     db.refresh(race)
+    plausibility.races.register(race.id, session.game_seed, 1)
     
     # Create Game (Participant) - Auto-join host
     game = models.Game(
@@ -70,14 +76,15 @@ async def start_single_player(config: dict = None, current_user: models.User = D
     }
 
 class CreateLobbyRequest(BaseModel):
-    max_players: int = 5
+    # Above LARGE_LOBBY_THRESHOLD the lobby runs in large-lobby mode (interest management, shared lanes)
+    max_players: int = Field(5, ge=1, le=settings.LARGE_LOBBY_MAX_PLAYERS)
 
 class LobbyResponse(BaseModel):
     session_id: str
     host_id: int
     players: list
 
-@router.post("/lobby", response_model=LobbyResponse)
+@router.post("/lobby", response_model=LobbyResponse, dependencies=[Depends(drain.refuse_new_sessions)])
 async def create_lobby(request: CreateLobbyRequest, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
     # Create Session directly (Race created at start)
     session = models.MultiplayerSession(
@@ -109,7 +116,7 @@ async def create_lobby(request: CreateLobbyRequest, current_user: models.User =
 class JoinLobbyRequest(BaseModel):
     car_index: int = 0
 
-@router.post("/lobby/{session_id}/join", response_model=LobbyResponse)
+@router.post("/lobby/{session_id}/join", response_model=LobbyResponse, dependencies=[Depends(drain.refuse_new_sessions)])
 async def join_lobby(session_id: int, request: JoinLobbyRequest, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
     session = db.query(models.MultiplayerSession).filter(models.MultiplayerSession.id == session_id).first()
     if not session:
@@ -130,6 +137,8 @@ async def join_lobby(session_id: int, request: JoinLobbyRequest, current_user: m
         models.Game.user_id == current_user.id
     ).first()
     
+    # Keeps the lobby off the reaper while people are still joining
+    session.last_activity_at = func.now()
     if not game:
         # Join
         game = models.Game(
@@ -161,70 +170,41 @@ async def join_lobby(session_id: int, request: JoinLobbyRequest, current_user: m
     }
 
 async def _start_session_game(session: models.MultiplayerSession, db: Session):
-    session.status = "started"
-    # Generate final seed
-    session.game_seed = str(uuid.uuid4())
-    
-    import copy
-    config = copy.deepcopy(settings.GAME_CONFIG)
-    config["world"]["seed"] = session.game_seed
-    config["is_multiplayer"] = True
-    
-    # Scale lanes to player count
-    num_players = len(session.games)
-    # Strict matching: 2 players -> 2 lanes. 3 players -> 3 lanes.
-    max_lanes = max(1, num_players) # Ensure at least 1 lane
-    config["lanes"]["maxLanes"] = max_lanes
-    
-    # Randomize lanes (1-based index) for all players
-    available_lanes = list(range(1, max_lanes + 1))
-    random.shuffle(available_lanes)
-    
-    lane_map = {}
-    for i, game in enumerate(session.games):
-        # Assign lane
-        assigned = available_lanes[i % len(available_lanes)]
-        game.assigned_lane = assigned
-        game.score = 0
-        game.finished_at = None
-        lane_map[str(game.user_id)] = assigned
-        
-    # Start car in one of the assigned lanes (e.g. Host's)
-    config["player"]["initialLane"] = lane_map.get(str(session.host_id), 1)
-    
-    # Create Race now
-    race = models.Race(
-        name=f"Race for Session {session.id}",
-        config=config,
-        car_index=0
-    )
-    db.add(race)
-    db.flush() # Get race ID
-    
-    # Link games to this race
-    for game in session.games:
-        game.race_id = race.id
-        
+    # Lanes and config are computed up front; the DB work is a single statement
+    user_ids = [user_id for (user_id,) in db.query(models.Game.user_id)
+                .filter(models.Game.multiplayer_session_id == session.id)
+                .order_by(models.Game.id)]
+    session_id, host_id, max_players, prev_seed = session.id, session.host_id, session.max_players, session.game_seed
+
+    seed = str(uuid.uuid4())
+    config, lane_map = race_setup.build_race_config(seed, user_ids, host_id, max_players)
+    race_id = race_setup.start_race(db, session_id, prev_seed, seed, config, lane_map)
+    if race_id is None:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Race is already starting or the lobby changed, please retry")
     db.commit()
+
+    plausibility.races.register(race_id, seed, len(user_ids))
+    websocket_manager.manager.set_large(str(session_id), race_setup.is_large_lobby(max_players))
     
     # Broadcast Start
     await websocket_manager.manager.broadcast({
         "type": "game_start",
-        "race_id": race.id,
+        "race_id": race_id,
         "config": config,
-        "seed": session.game_seed,
+        "seed": seed,
         "lane_assignments": lane_map
-    }, str(session.id))
+    }, str(session_id))
     
     return {
         "status": "started",
-        "race_id": race.id,
+        "race_id": race_id,
         "config": config,
-        "seed": session.game_seed,
+        "seed": seed,
         "lane_assignments": lane_map
     }
 
-@router.post("/lobby/{session_id}/start")
+@router.post("/lobby/{session_id}/start", dependencies=[Depends(drain.refuse_new_sessions)])
 async def start_game(session_id: int, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
     session = db.query(models.MultiplayerSession).filter(models.MultiplayerSession.id == session_id).first()
     if not session:
@@ -235,7 +215,7 @@ async def start_game(session_id: int, current_user: models.User = Depends(securi
         
     return await _start_session_game(session, db)
 
-@router.post("/lobby/{session_id}/retry")
+@router.post("/lobby/{session_id}/retry", dependencies=[Depends(drain.refuse_new_sessions)])
 async def retry_lobby(session_id: int, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
     session = db.query(models.MultiplayerSession).filter(models.MultiplayerSession.id == session_id).first()
     if not session:
@@ -244,139 +224,413 @@ async def retry_lobby(session_id: int, current_user: models.User = Depends(secur
     if session.host_id != current_user.id:
         raise HTTPException(status_code=403, detail="Only host can retry game")
         
-    result = await _start_session_game(session, db)
-    # _start_session_game returns ONLY race_id. We need more data.
-    # We need to refactor _start_session_game to return the data or fetch it here.
-    # Refactoring _start_session_game is better.
-    return result
+    return await _start_session_game(session, db)
 
-@router.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, db: Session = Depends(database.get_db)):
-    # Don't accept yet, manager.connect will do it
+class MatchmakingRequest(BaseModel):
+    max_players: int = Field(5, ge=2, le=settings.LARGE_LOBBY_MAX_PLAYERS)
+    car_index: int = 0
+
+@router.post("/matchmaking", dependencies=[Depends(drain.refuse_new_sessions)])
+async def join_matchmaking(request: MatchmakingRequest, current_user: models.User = Depends(security.get_current_user)):
+    # No DB work here: the matcher creates sessions, races and games for a whole batch at once
+    position = matchmaking.matchmaker.enqueue(matchmaking.Ticket(
+        user_id=current_user.id,
+        username=current_user.username,
+        max_players=request.max_players,
+        car_index=request.car_index
+    ))
+    return {"status": "queued", "position": position}
+
+@router.get("/matchmaking")
+async def get_matchmaking_status(current_user: models.User = Depends(security.get_current_read_user)):
+    match = matchmaking.matchmaker.take_match(current_user.id)
+    if match:
+        return {"status": "matched", **match}
+    position = matchmaking.matchmaker.position(current_user.id)
+    if position is None:
+        return {"status": "idle"}
+    return {"status": "queued", "position": position}
+
+@router.delete("/matchmaking")
+async def leave_matchmaking(current_user: models.User = Depends(security.get_current_read_user)):
+    return {"status": "cancelled" if matchmaking.matchmaker.cancel(current_user.id) else "idle"}
+
+@router.get("/matchmaking/stats")
+async def get_matchmaking_stats(current_user: models.User = Depends(security.get_current_read_user)):
+    return matchmaking.matchmaker.stats()
+
+@router.get("/lobby/{session_id}/connections")
+async def get_connection_stats(session_id: int, current_user: models.User = Depends(security.get_current_read_user)):
+    # Per-client inbound counters (relayed / dropped / coalesced / capped) and RTT for connected players
+    return websocket_manager.manager.client_stats(str(session_id))
+
+@router.websocket("/ws/leaderboards")
+async def leaderboards_websocket(websocket: WebSocket, db: Session = Depends(database.get_read_db)):
+    # Declared before /ws/{session_id} so it isn't captured by that route.
+    # One snapshot on connect, then deltas pushed by leaderboard_feed.
+    reason = admission.controller.admit_websocket("ws /game/ws/leaderboards")
+    if reason:
+        db.close()
+        await admission.reject_websocket(websocket, reason)
+        return
+
+    snapshot = {
+        "global": _global_leaderboard(db),
+        "daily": daily_challenge.get_daily_leaderboard(db)
+    }
+    # Don't hold a DB connection for the lifetime of the subscription
+    db.close()
+
+    await leaderboard_feed.feed.subscribe(websocket, snapshot)
+    try:
+        while True:
+            # Clients don't send anything meaningful; this just detects disconnects
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        leaderboard_feed.feed.unsubscribe(websocket)
+
+@router.get("/lobby/{session_id}/spectators")
+async def get_spectator_stats(session_id: int, current_user: models.User = Depends(security.get_current_read_user)):
+    return spectators.hub.stats(str(session_id))
+
+@router.websocket("/ws/matchmaking")
+async def matchmaking_websocket(websocket: WebSocket, db: Session = Depends(database.get_read_db)):
+    # Declared before /ws/{session_id}. Receives {"type": "match_found", ...} once matched.
     token = websocket.query_params.get("token")
-    if not token:
-        await websocket.accept() # Accept just to close with code
-        await websocket.close(code=4003, reason="Missing token")
+    user = security.get_user_from_token(token, db) if token else None
+    db.close()
+    if not user:
+        await websocket.accept()
+        await websocket.close(code=4003, reason="Invalid token")
         return
-        
-    user = security.get_user_from_token(token, db)
+
+    reason = admission.controller.admit_websocket("ws /game/ws/matchmaking")
+    if reason:
+        await admission.reject_websocket(websocket, reason)
+        return
+
+    await matchmaking.matchmaker.subscribe(websocket, user.id)
+    try:
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        matchmaking.matchmaker.unsubscribe(user.id, websocket)
+
+@router.websocket("/ws/{session_id}/spectate")
+async def spectate_websocket(websocket: WebSocket, session_id: str, db: Session = Depends(database.get_read_db)):
+    # Read-only: any logged in user can watch a multiplayer session, whether or not they're racing in it.
+    # Single player sessions (max_players=1) are private; only admins may watch those.
+    token = websocket.query_params.get("token")
+    user = security.get_user_from_token(token, db) if token else None
     if not user:
         await websocket.accept()
         await websocket.close(code=4003, reason="Invalid token")
         return
-        
-    # Check if user joined this session
+
     try:
-        s_id = int(session_id)
+        session = db.query(models.MultiplayerSession).filter(models.MultiplayerSession.id == int(session_id)).first()
     except ValueError:
+        session = None
+    # Don't hold a DB connection for the lifetime of the stream
+    db.close()
+    if not session:
         await websocket.accept()
         await websocket.close(code=4000, reason="Invalid session ID")
         return
+    if session.status == "abandoned":
+        await websocket.accept()
+        await websocket.close(code=4000, reason="Session is closed")
+        return
+    if (session.max_players or 0) <= 1 and user.id not in settings.ADMIN_USER_IDS:
+        await websocket.accept()
+        await websocket.close(code=4003, reason="Session is private")
+        return
 
-    joined_game = db.query(models.Game).filter(
-        models.Game.multiplayer_session_id == s_id,
-        models.Game.user_id == user.id
-    ).first()
+    reason = admission.controller.admit_websocket("ws /game/ws/{session_id}/spectate")
+    if reason:
+        await admission.reject_websocket(websocket, reason)
+        return
+
+    await websocket.accept()
+    if spectators.hub.is_full(session_id):
+        await websocket.close(code=1013, reason="Too many spectators")
+        return
+
+    # Current state first (players, last game_start), then live frames
+    journal = websocket_manager.manager.journal(session_id)
+    snapshot = json.dumps({**journal.catch_up(journal.seq), "type": "spectate_snapshot"})
+    spectator = spectators.hub.add(session_id, websocket, snapshot)
+    try:
+        while True:
+            # Nothing from spectators is relayed; this just detects disconnects
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        spectators.hub.remove(session_id, spectator)
+
+@router.websocket("/ws/{session_id}")
+async def websocket_endpoint(websocket: WebSocket, session_id: str, db: Session = Depends(database.get_db)):
+    # Don't accept yet, manager.connect will do it
+    token = websocket.query_params.get("token")
+    resume_token = websocket.query_params.get("resume")
+    resume = security.decode_resume_token(resume_token, session_id) if resume_token else None
     
-    if not joined_game:
-        await websocket.accept()
-        await websocket.close(code=4003, reason="User not in this session")
+    if resume:
+        # Handed off by a draining instance: the signed token already says who this is and
+        # that they're in the session, so a wave of rejoins costs no DB lookups
+        user_id = int(resume["sub"])
+        race_id = resume.get("race_id")
+        large = bool(resume.get("large"))
+    else:
+        if not token:
+            await websocket.accept() # Accept just to close with code
+            await websocket.close(code=4003, reason="Missing token")
+            return
+            
+        user = security.get_user_from_token(token, db)
+        if not user:
+            await websocket.accept()
+            await websocket.close(code=4003, reason="Invalid token")
+            return
+            
+        # Check if user joined this session
+        try:
+            s_id = int(session_id)
+        except ValueError:
+            await websocket.accept()
+            await websocket.close(code=4000, reason="Invalid session ID")
+            return
+
+        joined_game = db.query(models.Game).filter(
+            models.Game.multiplayer_session_id == s_id,
+            models.Game.user_id == user.id
+        ).first()
+        
+        if not joined_game:
+            await websocket.accept()
+            await websocket.close(code=4003, reason="User not in this session")
+            return
+        
+        user_id = user.id
+        race_id = joined_game.race_id
+        large = bool(joined_game.session and race_setup.is_large_lobby(joined_game.session.max_players))
+    # Don't hold a DB connection for the lifetime of the socket; writes below open their own
+    db.close()
+    
+    live = session_id in websocket_manager.manager.active_connections
+    reason = admission.controller.admit_websocket("ws /game/ws/{session_id}", new_session=not live, rejoin=live)
+    if reason:
+        await admission.reject_websocket(websocket, reason)
         return
     
-    await websocket_manager.manager.connect(websocket, session_id)
+    if large:
+        websocket_manager.manager.set_large(session_id, True)
+    await websocket_manager.manager.connect(websocket, session_id, user_id)
+    
+    # Sessions started before this process (or single player races) haven't broadcast a game_start
+    journal = websocket_manager.manager.journal(session_id)
+    if journal.race_id is None:
+        journal.race_id = race_id
+    
+    # Reconnect: client passes the last seq it saw and gets a catch-up batch
+    last_seq = websocket.query_params.get("last_seq")
+    if last_seq is not None and last_seq.isdigit():
+        await websocket_manager.manager.send_resync(websocket, session_id, int(last_seq))
+    
+    # Per-connection budgets: excess moves are coalesced, collect amounts capped, other spam dropped
+    limiter = ws_rate_limit.InboundLimiter()
+    heartbeat = websocket_manager.Heartbeat(websocket)
+    heartbeat_task = asyncio.create_task(heartbeat.run())
+    websocket_manager.manager.track_client(session_id, user_id, limiter, heartbeat)
+    
+    async def relay(message: dict):
+        await websocket_manager.manager.broadcast(message, session_id, exclude=websocket)
+    
     try:
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            heartbeat.touch()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                limiter.dropped += 1
+                continue
+            if message.get("type") == "pong":
+                heartbeat.on_pong(message)
+                continue
             
             # Re-broadcast to others
-            message["user_id"] = user.id
-            await websocket_manager.manager.broadcast(message, session_id, exclude=websocket)
+            message["user_id"] = user_id
+            message = limiter.admit(message)
+            if message is None:
+                limiter.schedule_flush(relay)
+                continue
+            
+            # Clock sync: reply to the sender only (client estimates RTT + offset to server_ts)
+            if message.get("type") == "time_sync":
+                await websocket.send_json({
+                    "type": "time_sync",
+                    "client_ts": message.get("client_ts"),
+                    "server_ts": websocket_manager.server_time_ms()
+                })
+                continue
+            
+            await relay(message)
             
             # Persist 'collect' events
             if message.get("type") == "collect":
-                amount = message.get("amount", 1)
-                success, msg = daily_challenge.increment_dates(db, user, amount)
+                amount = message["amount"]
+                with database.SessionLocal() as collect_db:
+                    # Fresh row: the penalty check reads the current score and challenge date
+                    collect_user = collect_db.query(models.User).filter(models.User.id == user_id).first()
+                    success, msg = daily_challenge.increment_dates(collect_db, collect_user, amount)
                 if not success:
-                    print(f"WS Collect Error for {user.username}: {msg}")
+                    logger.warning(f"WS Collect Error for user {user_id}: {msg}")
             
-    except WebSocketDisconnect:
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: socket already closed by the heartbeat
+        pass
+    finally:
+        heartbeat_task.cancel()
         websocket_manager.manager.disconnect(websocket, session_id)
+        websocket_manager.manager.untrack_client(session_id, user_id, limiter)
         # Notify others of disconnection
-        await websocket_manager.manager.broadcast({"type": "player_disconnected", "id": user.id}, session_id)
+        await websocket_manager.manager.broadcast({"type": "player_disconnected", "id": user_id}, session_id)
 
 
 
-@router.get("/leaderboard")
-async def get_leaderboard(db: Session = Depends(database.get_db)):
+def _global_leaderboard(db: Session):
+    if scores.leaderboard.loaded:
+        return [scores.format_entry(e) for e in scores.leaderboard.top(settings.LEADERBOARD_LIMIT)]
     users = db.query(models.User).filter(models.User.score > 0).order_by(models.User.score.desc()).limit(settings.LEADERBOARD_LIMIT).all()
     return [{"id": u.id, "username": f"{u.username}#{u.id}", "score": u.score, "photo": u.profile_photo} for u in users]
 
+@router.get("/leaderboard")
+async def get_leaderboard(db: Session = Depends(database.get_read_db)):
+    return _global_leaderboard(db)
+
+@router.get("/leaderboard/page")
+async def get_leaderboard_page(after_score: int | None = None, after_id: int | None = None, limit: int = Query(20, ge=1, le=100)):
+    # Keyset pagination: pass the last entry's score + id as the cursor for the next page.
+    # Served from the in-memory board, so deep pages cost the same as page one.
+    if after_score is None or after_id is None:
+        entries = scores.leaderboard.top(limit)
+    else:
+        entries = scores.leaderboard.after(after_score, after_id, limit)
+    
+    next_cursor = None
+    if len(entries) == limit:
+        last = entries[-1]
+        next_cursor = {"after_score": last["value"], "after_id": last["id"]}
+    
+    return {"entries": [scores.format_entry(e) for e in entries], "next": next_cursor}
+
+@router.get("/leaderboard/around")
+async def get_leaderboard_around(radius: int = Query(3, ge=0, le=25), current_user: models.User = Depends(security.get_current_read_user)):
+    # Entries around the player's own position (empty if they have no score yet)
+    entries = scores.leaderboard.around(current_user.id, radius)
+    return {
+        "rank": scores.leaderboard.rank(current_user.id),
+        "entries": [scores.format_entry(e) for e in entries]
+    }
+
+@router.get("/history")
+async def get_game_history(
+    before_finished_at: datetime | None = None,
+    before_id: int | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: models.User = Depends(security.get_current_read_user),
+    db: Session = Depends(database.get_read_db)
+):
+    # Newest first; pass the previous page's `next` values to continue
+    return scores.game_history(db, current_user.id, limit, before_finished_at, before_id)
+
+@router.get("/stats")
+async def get_my_stats(current_user: models.User = Depends(security.get_current_read_user), db: Session = Depends(database.get_read_db)):
+    return scores.get_user_stats(db, current_user.id)
+
+@router.get("/stats/{user_id}")
+async def get_stats(user_id: int, current_user: models.User = Depends(security.get_current_read_user), db: Session = Depends(database.get_read_db)):
+    return scores.get_user_stats(db, user_id)
+
 class ScoreSubmission(BaseModel):
     score: int
 
 @router.post("/{race_id}/score")
 async def submit_score(race_id: int, submission: ScoreSubmission, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
-    # Find the game record
-    # race_id here is actually session_id in current flow context? 
-    # Frontend might pass session_id or race_id. 
-    # Let's assume it passes the Race ID returned in start_game.
-    
-    # Actually, models.Game links to race_id.
-    
-    game = db.query(models.Game).filter(
-        models.Game.race_id == race_id,
-        models.Game.user_id == current_user.id
-    ).first()
-    
-    if not game:
-        # Fallback: create a new Game record if missing
-        game = models.Game(
-            user_id=current_user.id,
-            race_id=race_id if race_id > 0 else None,
-            score=submission.score
-        )
-        db.add(game)
-    else:
-        game.score = submission.score
-        game.finished_at = func.now()
+    # race_id is the Race ID returned in start_game / start_single_player.
+    # Game upsert, race + session status and high score are written in one statement.
+    if race_id <= 0:
+        # Without a race the game row has no key, and a retried submission would insert another one
+        raise HTTPException(status_code=400, detail="Invalid race ID")
+    # Implausible scores are stored on the game but kept off the high score and leaderboards
+    quarantined = not scores.is_plausible_score(db, race_id, submission.score)
     
-    # Update Race Status to finished
-    race = db.query(models.Race).filter(models.Race.id == race_id).first()
-    if race:
-        race.status = "finished"
+    # A pending daily challenge penalty is materialized by this write
+    previous_high_score = daily_challenge.effective_user_score(current_user)
+    penalized = previous_high_score == 0 and bool(current_user.score)
+    user_entry = (current_user.id, current_user.username, current_user.profile_photo)
+    new_high_score = scores.submit_game_score(db, current_user.id, race_id, submission.score, quarantined, penalized)
     
-    # Update Multiplayer Session status if applicable
-    if game and game.multiplayer_session_id:
-        session = db.query(models.MultiplayerSession).filter(models.MultiplayerSession.id == game.multiplayer_session_id).first()
-        if session:
-            session.status = "ended"
+    if quarantined:
+        logger.warning(f"Quarantined score {submission.score} from user {current_user.id} for race {race_id}")
+        if penalized:
+            scores.publish_high_score(user_entry[0], user_entry[1], new_high_score, user_entry[2])
+        return {"status": "quarantined", "new_high_score": new_high_score}
     
-    # Update User High Score
-    if submission.score > current_user.score:
-        current_user.score = submission.score
-        
-    db.commit()
+    if new_high_score > previous_high_score or penalized:
+        scores.publish_high_score(user_entry[0], user_entry[1], new_high_score, user_entry[2])
     
-    return {"status": "success", "new_high_score": current_user.score}
+    return {"status": "success", "new_high_score": new_high_score}
 
 
+@router.get("/{race_id}/replay")
+async def get_replay(race_id: int, current_user: models.User = Depends(security.get_current_read_user), db: Session = Depends(database.get_read_db)):
+    # Streams the race's recorded frames as NDJSON, read lazily from the memory-mapped log
+    # Only the race's own players (and admins) may watch it back
+    if current_user.id not in settings.ADMIN_USER_IDS and not db.query(
+        db.query(models.Game.id).filter(models.Game.race_id == race_id, models.Game.user_id == current_user.id).exists()
+    ).scalar():
+        raise HTTPException(status_code=403, detail="Not a participant of this race")
+    if not replay.replay_exists(race_id):
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return StreamingResponse(replay.stream_replay(race_id), media_type="application/x-ndjson")
+
 
 @router.get("/challenge/status")
-async def get_challenge_status(current_user: models.User = Depends(security.get_current_user)):
+async def get_challenge_status(current_user: models.User = Depends(security.get_current_read_user)):
     return daily_challenge.get_status(current_user)
 
+class CollectEvent(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64) # client generated, e.g. a UUID
+    ts: datetime # when it was collected (client clock)
+    count: int = Field(1, ge=1, le=settings.COLLECT_MAX_EVENT_COUNT)
+
 class CollectDateRequest(BaseModel):
-    count: int = 1
+    # Older clients send a single count (not deduplicated)
+    count: int = Field(1, ge=1, le=settings.COLLECT_MAX_EVENT_COUNT)
+    events: list[CollectEvent] | None = Field(None, max_length=settings.COLLECT_MAX_EVENTS)
 
 @router.post("/challenge/collect")
 async def collect_date(request: CollectDateRequest, current_user: models.User = Depends(security.get_current_user), db: Session = Depends(database.get_db)):
-    success, message = daily_challenge.increment_dates(db, current_user, request.count)
+    # Clients may buffer events offline and flush them in one request; resending a
+    # batch is safe, already applied event ids are reported as duplicates
+    if request.events is None:
+        success, result = daily_challenge.collect_dates(db, current_user, [(f"http-{uuid.uuid4()}", request.count, datetime.utcnow())])
+    else:
+        success, result = daily_challenge.collect_dates(db, current_user, [(e.id, e.count, e.ts) for e in request.events])
     if not success:
-        raise HTTPException(status_code=400, detail=message)
-    return {"status": "success", "collected": current_user.dates_collected_today}
+        raise HTTPException(status_code=400, detail=result)
+    return {"status": "success", **result}
 
 @router.get("/challenge/leaderboard")
-async def get_challenge_leaderboard(db: Session = Depends(database.get_db)):
-    return daily_challenge.get_daily_leaderboard(db)
+async def get_challenge_leaderboard(limit: int = Query(3, ge=1, le=100), db: Session = Depends(database.get_read_db)):
+    return daily_challenge.get_daily_leaderboard(db, limit)
 
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the backend the way the app runs it (from backend/). Postgres tests use
+# TEST_DATABASE_URL; everything else never touches the DB, so an in-memory sqlite will do.
+# Never the configured DATABASE_URL: some tests truncate tables.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or "sqlite://"
@@ -0,0 +1,69 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from libs import admission
+from libs.admission import AdmissionController, AdmissionMiddleware
+from libs.drain import drainer
+from libs.websocket_manager import manager
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(admission.settings, "ADMISSION_MAX_CONCURRENT", 2)
+    monkeypatch.setattr(admission.settings, "ADMISSION_ROUTE_LIMITS", "POST /api/game/lobby=1")
+    monkeypatch.setattr(admission.settings, "ADMISSION_MAX_LOOP_LAG", 0.25)
+    monkeypatch.setattr(admission.settings, "ADMISSION_MAX_DB_POOL_USAGE", 0.9)
+    controller = AdmissionController()
+    monkeypatch.setattr(controller, "db_pool_usage", lambda: 0.0)
+    monkeypatch.setattr(admission, "controller", controller)
+    return controller
+
+def test_route_limits_are_parsed():
+    assert admission._parse_route_limits(" post /a=5, GET /b=1,") == {("POST", "/a"): 5, ("GET", "/b"): 1}
+
+def test_global_and_route_concurrency(controller):
+    assert controller.try_acquire("POST", "/api/game/lobby") is None
+    assert controller.try_acquire("POST", "/api/game/lobby") == "route_concurrency"
+    assert controller.try_acquire("GET", "/api/game/leaderboard") is None
+    assert controller.try_acquire("GET", "/api/game/leaderboard") == "concurrency"
+
+    controller.release("POST", "/api/game/lobby")
+    assert controller.in_flight == 1 and controller.route_in_flight[("POST", "/api/game/lobby")] == 0
+    assert controller.try_acquire("POST", "/api/game/lobby") is None
+    assert controller.shed == {("route_concurrency", "POST /api/game/lobby"): 1, ("concurrency", "GET /api/game/leaderboard"): 1}
+
+def test_overload_sheds_everything(controller, monkeypatch):
+    controller.loop_lag = 0.5
+    assert controller.try_acquire("GET", "/x") == "loop_lag"
+    controller.loop_lag = 0.0
+    monkeypatch.setattr(controller, "db_pool_usage", lambda: 0.95)
+    assert controller.try_acquire("GET", "/x") == "db_pool"
+    assert controller.admit_websocket("ws /x") == "db_pool"
+    assert controller.in_flight == 0 and controller.admitted == 0
+
+def test_websockets_shed_on_drain_and_session_cap(controller, monkeypatch):
+    monkeypatch.setattr(admission.settings, "WS_MAX_ACTIVE_SESSIONS", 1)
+    monkeypatch.setattr(manager, "active_connections", {"1": {}})
+    assert controller.admit_websocket("ws /x") is None
+    assert controller.admit_websocket("ws /x", new_session=True) == "max_sessions"
+
+    monkeypatch.setattr(drainer, "draining", True)
+    assert controller.admit_websocket("ws /x") == "draining"
+    assert controller.admit_websocket("ws /x", rejoin=True) is None
+
+def test_middleware_returns_503_with_retry_after(controller, monkeypatch):
+    monkeypatch.setattr(admission.settings, "ADMISSION_RETRY_AFTER", 7)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware)
+    app.get("/x")(lambda: {"ok": True})
+    app.get("/health")(lambda: {"ok": True})
+    client = TestClient(app)
+
+    assert client.get("/x").status_code == 200
+    assert controller.in_flight == 0
+
+    controller.loop_lag = 1.0
+    response = client.get("/x")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+    assert response.json()["reason"] == "loop_lag"
+    assert client.get("/health").status_code == 200 # exempt
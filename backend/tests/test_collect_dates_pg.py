@@ -0,0 +1,64 @@
+"""
+Collect event dedup in COLLECT_DATES_SQL against a real Postgres (the statement is Postgres-only).
+
+Needs a scratch database, migrated to head; its tables are truncated:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dash_test python -m pytest tests/test_collect_dates_pg.py
+"""
+import os
+from datetime import datetime, timedelta
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+
+from sqlalchemy import text
+from database import models
+from database.database import SessionLocal
+from libs import daily_challenge
+
+@pytest.fixture
+def db(monkeypatch):
+    """One user, with the challenge window open all day."""
+    monkeypatch.setattr(daily_challenge, "CHALLENGE_START_HOUR", 0)
+    monkeypatch.setattr(daily_challenge, "CHALLENGE_END_HOUR", 24)
+    monkeypatch.setattr(daily_challenge, "_daily_board", daily_challenge.RankIndex())
+    monkeypatch.setattr(daily_challenge, "_daily_board_date", None)
+    db = SessionLocal()
+    db.execute(text("TRUNCATE user_stats, collect_events, games, races, multiplayer_sessions, users RESTART IDENTITY CASCADE"))
+    db.add(models.User(username="u1", email="u1@test", score=0))
+    db.commit()
+    yield db
+    db.close()
+
+def _collect(db, *events):
+    user = db.get(models.User, 1)
+    return daily_challenge.collect_dates(db, user, [(event_id, count, datetime.utcnow()) for event_id, count in events])
+
+def test_retried_batch_counts_once(db):
+    ok, result = _collect(db, ("a", 1), ("b", 2))
+    assert ok and result["collected"] == 3 and result["accepted"] == ["a", "b"]
+
+    ok, result = _collect(db, ("a", 1), ("b", 2), ("c", 1))
+    assert result["collected"] == 4
+    assert result["accepted"] == ["c"] and result["duplicates"] == ["a", "b"]
+
+    ok, result = _collect(db, ("c", 1))
+    assert result["collected"] == 4 and result["accepted"] == [] and result["duplicates"] == ["c"]
+    assert db.execute(text("SELECT count(*), sum(count) FROM collect_events")).one() == (3, 4)
+
+def test_repeated_id_in_one_batch_counts_once(db):
+    ok, result = _collect(db, ("a", 1), ("a", 1))
+    assert result["collected"] == 1 and result["accepted"] == ["a"] and result["duplicates"] == []
+
+def test_other_users_may_reuse_an_event_id(db):
+    db.add(models.User(username="u2", email="u2@test", score=0))
+    db.commit()
+    _collect(db, ("a", 1))
+    ok, result = daily_challenge.collect_dates(db, db.get(models.User, 2), [("a", 2, datetime.utcnow())])
+    assert result["collected"] == 2 and result["accepted"] == ["a"]
+
+def test_future_events_are_rejected_without_a_write(db):
+    ok, result = daily_challenge.collect_dates(db, db.get(models.User, 1), [("a", 1, datetime.utcnow() + timedelta(hours=1))])
+    assert ok and result["collected"] == 0
+    assert result["rejected"] == [{"id": "a", "reason": "in_future"}]
+    assert db.execute(text("SELECT count(*) FROM collect_events")).scalar() == 0
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from database import database
+from libs import drain, security, websocket_manager
+from libs.drain import Drainer
+from libs.websocket_manager import ConnectionManager
+from routes import game
+from tests.test_websocket_manager import FakeSocket as TextSocket
+
+class FakeSocket(TextSocket):
+    async def send_json(self, message: dict):
+        self.sent.append(message)
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = ConnectionManager()
+    monkeypatch.setattr(websocket_manager, "manager", manager)
+    monkeypatch.setattr(drain, "manager", manager)
+    return manager
+
+def test_resume_token_is_bound_to_its_session():
+    token = security.create_resume_token(5, "7", 3, True)
+    claims = security.decode_resume_token(token, "7")
+    assert (claims["sub"], claims["race_id"], claims["large"]) == ("5", 3, True)
+    assert security.decode_resume_token(token, "8") is None
+    assert security.decode_resume_token(token + "x", "7") is None
+    # Not a login token: get_user_from_token refuses it before touching the DB
+    assert security.get_user_from_token(token, db=None) is None
+
+def test_expired_resume_token_is_refused(monkeypatch):
+    monkeypatch.setattr(security.settings, "DRAIN_RESUME_TOKEN_TTL", -1)
+    assert security.decode_resume_token(security.create_resume_token(5, "7", None, False), "7") is None
+
+def test_resume_rejoins_without_the_db(manager):
+    class NoDB:
+        def close(self):
+            pass
+
+    app = FastAPI()
+    app.include_router(game.router, prefix="/api")
+    app.dependency_overrides[database.get_db] = NoDB
+    client = TestClient(app)
+
+    token = security.create_resume_token(5, "7", 3, False)
+    with client.websocket_connect(f"/api/game/ws/7?resume={token}&last_seq=0") as ws:
+        ws.send_json({"type": "time_sync", "client_ts": 1})
+        while (message := ws.receive_json())["type"] != "time_sync":
+            pass
+        assert message["client_ts"] == 1
+        assert list(manager.connection_users.values()) == [5]
+        assert manager.journal("7").race_id == 3
+
+    # A resume token for another session falls back to ?token=, which is missing here
+    with client.websocket_connect(f"/api/game/ws/8?resume={token}") as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 4003
+
+def test_drain_hands_lobbies_off_with_resume_tokens(manager, monkeypatch):
+    monkeypatch.setattr(drain.settings, "DRAIN_TIMEOUT", 1)
+    monkeypatch.setattr(drain.settings, "DRAIN_RECONNECT_SPREAD", 0)
+
+    async def run():
+        drainer = Drainer()
+        sockets = [FakeSocket(), FakeSocket()]
+        for user_id, ws in enumerate(sockets, start=1):
+            await manager.connect(ws, "7", user_id)
+        await drainer.start()
+        return drainer, sockets
+
+    drainer, sockets = asyncio.run(run())
+    for user_id, ws in enumerate(sockets, start=1):
+        notice = ws.sent[0]
+        assert notice["type"] == "server_draining" and notice["reconnect"] == "now"
+        assert security.decode_resume_token(notice["resume_token"], "7")["sub"] == str(user_id)
+        assert ws.closed == drain.SERVICE_RESTART
+    assert drainer.handed_off == 2 and drainer.status()["done"]
+    assert manager.active_connections == {}
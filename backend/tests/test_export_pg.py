@@ -0,0 +1,74 @@
+"""
+Keyset-chunked export of games joined to users and races.
+
+Needs a scratch database, migrated to head; its tables are truncated:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dash_test python -m pytest tests/test_export_pg.py
+"""
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+
+from sqlalchemy import event, text
+from database import models
+from database.database import SessionLocal, engine
+from libs import export
+
+DAY = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(autouse=True)
+def games(monkeypatch):
+    """Two users with 7 finished games, one a day from DAY, and one unfinished game."""
+    monkeypatch.setattr(export, "ReadSessionLocal", None)
+    monkeypatch.setattr(export.settings, "EXPORT_CHUNK_ROWS", 3)
+    monkeypatch.setattr(export.settings, "EXPORT_FLUSH_BYTES", 64)
+    db = SessionLocal()
+    db.execute(text("TRUNCATE user_stats, collect_events, games, races, multiplayer_sessions, users RESTART IDENTITY CASCADE"))
+    db.add_all([models.User(username=f"u{i}", email=f"u{i}@test", score=0) for i in (1, 2)])
+    db.add(models.Race(name="race, \"quoted\""))
+    db.commit()
+    db.add_all([
+        models.Game(user_id=1 + i % 2, race_id=1, score=10 * i, finished_at=DAY + timedelta(days=i))
+        for i in range(7)
+    ])
+    db.add(models.Game(user_id=1, race_id=1, score=0))
+    db.commit()
+    db.close()
+
+def test_rows_span_chunks_without_gaps_or_repeats():
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        rows = list(export.iter_rows())
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert [row[0] for row in rows] == list(range(1, 9))
+    # 3 + 3 + 2 rows: the short chunk ends it
+    assert sum("FROM games" in statement for statement in statements) == 3
+    assert rows[0][:5] == (1, 1, "u1", 1, "race, \"quoted\"")
+
+def test_finished_at_filters():
+    rows = list(export.iter_rows(start=DAY + timedelta(days=2), end=DAY + timedelta(days=5)))
+    assert [row[0] for row in rows] == [3, 4, 5]
+
+def test_csv_and_ndjson_round_trip():
+    parsed = list(csv.reader(io.StringIO(b"".join(export.export("csv")).decode())))
+    assert parsed[0] == export.COLUMNS
+    assert len(parsed) == 9 and parsed[1][4] == "race, \"quoted\""
+    assert parsed[2][10] == (DAY + timedelta(days=1)).isoformat()
+
+    lines = b"".join(export.export("ndjson", start=DAY)).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["game_id"] for r in records] == list(range(1, 8))
+    assert records[6]["score"] == 60
+
+def test_gzip_matches_the_plain_stream():
+    plain = b"".join(export.export("ndjson"))
+    assert gzip.decompress(b"".join(export.export("ndjson", gzip=True))) == plain
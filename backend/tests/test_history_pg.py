@@ -0,0 +1,57 @@
+"""
+Keyset pagination of game_history on (finished_at, id).
+
+Needs a scratch database, migrated to head; its tables are truncated:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dash_test python -m pytest tests/test_history_pg.py
+"""
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+
+from sqlalchemy import text
+from database import models
+from database.database import SessionLocal
+from libs import scores
+
+DAY = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db():
+    """
+    User 1: 10 finished games, finished two at a time (so pages split ties on id), plus
+    two joined-but-unplayed ones. User 2: one game finished last.
+    """
+    db = SessionLocal()
+    db.execute(text("TRUNCATE user_stats, collect_events, games, races, multiplayer_sessions, users RESTART IDENTITY CASCADE"))
+    db.add_all([models.User(username=f"u{i}", email=f"u{i}@test", score=0) for i in (1, 2)])
+    db.commit()
+    db.add(models.Game(user_id=1, score=0))
+    db.add_all([models.Game(user_id=1, score=i, finished_at=DAY + timedelta(hours=i // 2)) for i in range(10)])
+    db.add(models.Game(user_id=2, score=99, finished_at=DAY + timedelta(days=1)))
+    db.add(models.Game(user_id=1, score=0))
+    db.commit()
+    yield db
+    db.close()
+
+def _pages(db, limit: int) -> list:
+    pages, cursor = [], {}
+    while True:
+        page = scores.game_history(db, 1, limit, **cursor)
+        pages.append([game["score"] for game in page["games"]])
+        if page["next"] is None:
+            return pages
+        cursor = page["next"]
+
+def test_pages_cover_every_finished_game_once_newest_first(db):
+    pages = _pages(db, 3)
+    assert pages == [[9, 8, 7], [6, 5, 4], [3, 2, 1], [0]]
+
+def test_exact_multiple_ends_with_an_empty_page(db):
+    assert _pages(db, 5) == [[9, 8, 7, 6, 5], [4, 3, 2, 1, 0], []]
+
+def test_cursor_needs_both_keys(db):
+    page = scores.game_history(db, 1, 3, before_finished_at=DAY + timedelta(hours=2))
+    assert [game["score"] for game in page["games"]] == [9, 8, 7]
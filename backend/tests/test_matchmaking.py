@@ -0,0 +1,60 @@
+import pytest
+from libs import matchmaking
+from libs.matchmaking import Matchmaker, Ticket
+
+@pytest.fixture(autouse=True)
+def timings(monkeypatch):
+    for name, value in {"MATCHMAKING_MAX_WAIT": 15, "MATCHMAKING_MIN_PLAYERS": 2, "MATCHMAKING_TICKET_TTL": 120, "MATCHMAKING_MATCH_TTL": 120}.items():
+        monkeypatch.setattr(matchmaking.settings, name, value)
+
+def _queue(matchmaker: Matchmaker, user_ids, max_players: int, at: float = 0.0):
+    for user_id in user_ids:
+        matchmaker.enqueue(Ticket(user_id=user_id, username=f"u{user_id}", max_players=max_players, enqueued_at=at))
+
+def _ids(groups):
+    return [[t.user_id for t in group] for group in groups]
+
+def test_full_lobbies_form_in_arrival_order_per_size():
+    matchmaker = Matchmaker()
+    _queue(matchmaker, range(1, 8), max_players=3)
+    _queue(matchmaker, [20, 21], max_players=2)
+    assert _ids(matchmaker.form_groups(now=1)) == [[1, 2, 3], [4, 5, 6], [20, 21]]
+    # The leftover keeps waiting; grouped players are no longer queued
+    assert matchmaker.position(7) == 1
+    assert matchmaker.position(1) is None
+
+def test_partial_lobby_waits_for_max_wait_and_min_players():
+    matchmaker = Matchmaker()
+    _queue(matchmaker, [1], max_players=4)
+    _queue(matchmaker, [2], max_players=4, at=10)
+    assert matchmaker.form_groups(now=14) == []
+    assert _ids(matchmaker.form_groups(now=15)) == [[1, 2]]
+
+    _queue(matchmaker, [3], max_players=4)
+    assert matchmaker.form_groups(now=100) == [] # alone: never a lobby of one
+
+def test_stale_tickets_expire():
+    matchmaker = Matchmaker()
+    _queue(matchmaker, [1], max_players=3)
+    _queue(matchmaker, [2, 3], max_players=3, at=110)
+    assert matchmaker.form_groups(now=121) == []
+    assert matchmaker.position(1) is None and matchmaker.expired == 1
+    assert matchmaker.position(2) == 1
+
+def test_requeue_replaces_the_previous_ticket_and_cancel_leaves():
+    matchmaker = Matchmaker()
+    _queue(matchmaker, [1, 2], max_players=3)
+    _queue(matchmaker, [1], max_players=2)
+    assert matchmaker.position(1) == 1 and len(matchmaker.queues[3]) == 1
+    assert matchmaker.cancel(2) and not matchmaker.cancel(2)
+    _queue(matchmaker, [3], max_players=2)
+    assert _ids(matchmaker.form_groups(now=1)) == [[1, 3]]
+
+def test_polled_match_is_handed_out_once_until_it_expires():
+    matchmaker = Matchmaker()
+    matchmaker.matches[1] = ({"session_id": "5"}, 0.0)
+    matchmaker.matches[2] = ({"session_id": "5"}, 0.0)
+    assert matchmaker.take_match(1) == {"session_id": "5"}
+    assert matchmaker.take_match(1) is None
+    matchmaker._expire_matches(now=121)
+    assert matchmaker.take_match(2) is None
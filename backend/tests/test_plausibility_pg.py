@@ -0,0 +1,64 @@
+"""
+Score plausibility for races this process didn't register, and the batch audit (Postgres-only SQL).
+
+Needs a scratch database, migrated to head; its tables are truncated:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dash_test python -m pytest tests/test_plausibility_pg.py
+"""
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+
+from sqlalchemy import text
+from database import models
+from database.database import SessionLocal
+from libs import plausibility, scores
+
+IMPOSSIBLE = 10 ** 9
+
+@pytest.fixture
+def db(monkeypatch):
+    """One player in a race started a minute ago that the registry has never seen."""
+    monkeypatch.setattr(plausibility, "races", plausibility.RaceRegistry(10))
+    db = SessionLocal()
+    db.execute(text("TRUNCATE user_stats, collect_events, games, races, multiplayer_sessions, users RESTART IDENTITY CASCADE"))
+    db.add(models.User(username="u1", email="u1@test", score=0))
+    db.commit()
+    db.add(models.MultiplayerSession(host_id=1, max_players=1, game_seed="session-seed", status="started"))
+    db.add(models.Race(name="race", config={"world": {"seed": "session-seed"}},
+                       created_at=datetime.now(timezone.utc) - timedelta(minutes=1)))
+    db.commit()
+    db.add(models.Game(user_id=1, race_id=1, multiplayer_session_id=1))
+    db.commit()
+    yield db
+    db.close()
+
+def test_unregistered_race_is_rebuilt_from_the_db(db):
+    assert scores.is_plausible_score(db, 1, 100)
+    assert not scores.is_plausible_score(db, 1, IMPOSSIBLE)
+    assert plausibility.races.get(1)[0] == "session-seed"
+
+def test_race_without_seed_in_config_uses_the_session_seed(db):
+    db.execute(text("UPDATE races SET config = NULL"))
+    db.commit()
+    assert scores.is_plausible_score(db, 1, 100)
+    assert plausibility.races.get(1)[0] == "session-seed"
+
+def test_unknown_race_is_implausible(db):
+    assert not scores.is_plausible_score(db, 99, 100)
+
+def test_audit_flags_accepted_scores_above_the_bound(db, monkeypatch):
+    db.add(models.User(username="u2", email="u2@test", score=0))
+    db.commit()
+    db.add(models.Game(user_id=2, race_id=1, multiplayer_session_id=1))
+    db.commit()
+    scores.submit_game_score(db, 1, 1, 100)
+    scores.submit_game_score(db, 2, 1, IMPOSSIBLE) # accepted, e.g. while the check was off
+    monkeypatch.setattr(scores.settings, "SCORE_AUDIT_BATCH_SIZE", 1) # one chunk per game
+
+    now = datetime.now(timezone.utc)
+    report = scores.audit_scores(db, now - timedelta(hours=1), now + timedelta(hours=1))
+    assert report["checked"] == 2
+    assert [(g["user_id"], g["score"]) for g in report["flagged"]] == [(2, IMPOSSIBLE)]
@@ -0,0 +1,17 @@
+import time
+from libs import profiling
+
+def test_spans_exclude_nested_db_time():
+    timings = {}
+    token = profiling._timings.set(timings)
+    try:
+        with profiling.span("auth"):
+            time.sleep(0.02)
+            # A query inside the span, recorded the way the engine listener does
+            query_started = time.perf_counter()
+            time.sleep(0.05)
+            profiling.add_timing("db", time.perf_counter() - query_started)
+    finally:
+        profiling._timings.reset(token)
+    assert timings["db"] >= 50
+    assert 15 < timings["auth"] < 40 # only the non-SQL part
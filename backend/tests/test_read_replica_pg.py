@@ -0,0 +1,102 @@
+"""
+Read routing (database.get_read_db) with a second local database standing in for the replica.
+
+Needs two scratch databases, migrated primary plus an empty one; the replica's tables are recreated:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dash_test \
+    TEST_READ_DATABASE_URL=postgresql://postgres@localhost/dash_replica python -m pytest tests/test_read_replica_pg.py
+"""
+import os
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_READ_DATABASE_URL = os.getenv("TEST_READ_DATABASE_URL")
+if not TEST_DATABASE_URL or not TEST_READ_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL / TEST_READ_DATABASE_URL not set", allow_module_level=True)
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.orm import sessionmaker
+from database import database, models
+from libs import security
+from libs.settings import settings
+
+@pytest.fixture
+def replica(monkeypatch):
+    """The same user under a different name in each database, so a read shows where it went."""
+    engine = create_engine(TEST_READ_DATABASE_URL)
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    for bind, name in ((database.engine, "primary"), (engine, "replica")):
+        with bind.begin() as conn:
+            if bind is database.engine:
+                conn.execute(text("TRUNCATE user_stats, collect_events, games, races, multiplayer_sessions, users RESTART IDENTITY CASCADE"))
+            conn.execute(text("INSERT INTO users (id, username, email, score) VALUES (1, :name, 'u1@test', 0)"), {"name": name})
+
+    monkeypatch.setattr(database, "read_engine", engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    monkeypatch.setattr(database, "_replica_checked_at", 0.0)
+    monkeypatch.setattr(database, "_replica_usable", False)
+    yield engine
+    engine.dispose()
+
+def _read_username() -> str:
+    db_gen = database.get_read_db()
+    db = next(db_gen)
+    try:
+        return db.query(models.User.username).filter(models.User.id == 1).scalar()
+    finally:
+        db_gen.close()
+
+def _expire_lag_check(monkeypatch):
+    monkeypatch.setattr(database, "_replica_checked_at", 0.0)
+
+def test_reads_go_to_caught_up_replica(replica):
+    assert _read_username() == "replica"
+
+def test_lagging_replica_falls_back_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(database, "REPLICA_LAG_SQL", text(f"SELECT {settings.READ_REPLICA_MAX_LAG_SECONDS + 30}"))
+    assert _read_username() == "primary"
+
+    # Caught up again: back to the replica once the cached result expires
+    monkeypatch.setattr(database, "REPLICA_LAG_SQL", text("SELECT 0"))
+    _expire_lag_check(monkeypatch)
+    assert _read_username() == "replica"
+
+def test_unreachable_replica_falls_back_to_primary(replica, monkeypatch):
+    engine = create_engine(make_url(TEST_READ_DATABASE_URL).set(database="no_such_database_for_tests"))
+    monkeypatch.setattr(database, "read_engine", engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=engine))
+    assert _read_username() == "primary"
+
+def test_lag_check_is_cached(replica, monkeypatch):
+    lag_queries = []
+
+    @event.listens_for(replica, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "pg_is_in_recovery" in statement:
+            lag_queries.append(statement)
+
+    for _ in range(10):
+        assert database.replica_is_usable()
+    assert len(lag_queries) == 1
+
+    _expire_lag_check(monkeypatch)
+    assert database.replica_is_usable()
+    assert len(lag_queries) == 2
+
+def test_get_current_read_user_loads_from_replica(replica, monkeypatch):
+    app = FastAPI()
+
+    @app.get("/me")
+    async def me(user: models.User = Depends(security.get_current_read_user)):
+        return {"username": user.username}
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {security.create_access_token({'sub': '1'})}"}
+    assert client.get("/me", headers=headers).json() == {"username": "replica"}
+
+    monkeypatch.setattr(database, "REPLICA_LAG_SQL", text(f"SELECT {settings.READ_REPLICA_MAX_LAG_SECONDS + 30}"))
+    _expire_lag_check(monkeypatch)
+    assert client.get("/me", headers=headers).json() == {"username": "primary"}
+    assert client.get("/me").status_code == 401
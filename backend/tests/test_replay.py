@@ -0,0 +1,32 @@
+import os
+import time
+from libs import replay
+
+def _write(path, size: int, age_days: float):
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+
+def test_prune_removes_expired_then_oldest_over_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(replay.settings, "REPLAY_DIR", str(tmp_path))
+    monkeypatch.setattr(replay.settings, "REPLAY_RETENTION_DAYS", 30)
+    monkeypatch.setattr(replay.settings, "REPLAY_MAX_TOTAL_MB", 2)
+    mb = 1024 * 1024
+    _write(tmp_path / "1.replay", 10, age_days=40) # expired
+    _write(tmp_path / "2.replay", mb, age_days=3)  # oldest under the cap
+    _write(tmp_path / "3.replay", mb, age_days=2)
+    _write(tmp_path / "4.replay", mb, age_days=1)
+    (tmp_path / "notes.txt").write_text("not a replay")
+
+    assert replay.prune_replays() == (2, 10 + mb)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["3.replay", "4.replay", "notes.txt"]
+    # Within limits: nothing else goes
+    assert replay.prune_replays() == (0, 0)
+
+def test_prune_keeps_logs_being_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(replay.settings, "REPLAY_DIR", str(tmp_path))
+    monkeypatch.setattr(replay.settings, "REPLAY_RETENTION_DAYS", 1)
+    _write(tmp_path / "7.replay", 10, age_days=5)
+    monkeypatch.setattr(replay.recorder, "_files", {7: None})
+    assert replay.prune_replays() == (0, 0)
+    assert (tmp_path / "7.replay").exists()
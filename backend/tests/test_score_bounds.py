@@ -0,0 +1,47 @@
+import numpy as np
+from libs import score_bounds
+from libs.score_bounds import max_scores, plausible_batch
+
+# First SeededRNG(seed).next() from src/lib/utils/rng.ts, run under node
+CLIENT_FIRST = {
+    "race-1_col_25": 0.3480260476935655,
+    "race-1_date_30": 0.7694679605774581,
+    "x_col_1234567": 0.9076764327473938,
+    "ünï_date_90": 0.8551852498203516,
+}
+
+def _first(seed: str) -> float:
+    return float(score_bounds._mulberry32_first(np.array([score_bounds._fnv1a(seed)], dtype=np.uint64))[0])
+
+def test_rng_matches_the_client():
+    for seed, expected in CLIENT_FIRST.items():
+        assert _first(seed) == expected
+        prefix, _, mark = seed.rpartition("_")
+        hashed = score_bounds._fnv1a_digits(np.array([score_bounds._fnv1a(prefix + "_")], dtype=np.uint64), np.array([int(mark)]))
+        assert float(score_bounds._mulberry32_first(hashed)[0]) == expected
+
+def test_spawns_match_rolling_each_mark():
+    seeds, limit = ["a", "bb"], np.array([1000.0, 260.0])
+    owner, marks = score_bounds._spawns(seeds, "col", 25, 0.5, limit)
+    expected = [(i, mark) for i, seed in enumerate(seeds) for mark in range(25, int(limit[i]), 25)
+                if _first(f"{seed}_col_{mark}") < 0.5]
+    assert list(zip(owner.tolist(), marks.tolist())) == expected
+
+def test_bound_grows_with_time_and_players():
+    elapsed = [0, 5, 30, 60, 120, 300]
+    bounds = max_scores(["seed"] * len(elapsed), elapsed, [1] * len(elapsed))
+    assert bounds[0] == 0
+    assert np.all(np.diff(bounds) > 0)
+    assert np.all(max_scores(["seed"] * 3, [120] * 3, [1, 2, 8]) >= bounds[4])
+
+def test_batch_matches_single_submissions():
+    seeds, elapsed, players = ["a", "b", "a", "c"], [10, 200, 90, -5], [1, 4, 2, 1]
+    batch = max_scores(seeds, elapsed, players)
+    assert batch.tolist() == [max_scores([s], [e], [p])[0] for s, e, p in zip(seeds, elapsed, players)]
+
+def test_plausible_batch_allows_slack(monkeypatch):
+    monkeypatch.setattr(score_bounds.settings, "SCORE_PLAUSIBILITY_SLACK", 1.5)
+    bound = max_scores(["seed"], [60], [1])[0]
+    mask = plausible_batch([bound, bound * 1.5, bound * 1.5 + 1, 0], ["seed"] * 4, [60] * 4, [1] * 4)
+    assert mask.tolist() == [True, True, False, True]
+    assert not plausible_batch([1], ["seed"], [0], [1])[0]
@@ -0,0 +1,95 @@
+"""
+Concurrency checks for SUBMIT_SCORE_SQL against a real Postgres (the statement is Postgres-only).
+
+Needs a scratch database, migrated to head; its tables are truncated:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dash_test python -m pytest tests/test_scores_pg.py
+"""
+import os
+import sys
+import threading
+import time
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import models
+from database.database import SessionLocal
+from libs import scores
+
+RACE_ID = 1
+
+@pytest.fixture
+def race():
+    """Three users in one started multiplayer race, nobody finished yet."""
+    db = SessionLocal()
+    db.execute(text("TRUNCATE user_stats, collect_events, games, races, multiplayer_sessions, users RESTART IDENTITY CASCADE"))
+    db.add_all([models.User(username=f"u{i}", email=f"u{i}@test", score=0) for i in range(1, 4)])
+    db.commit()
+    db.add(models.MultiplayerSession(host_id=1, game_seed="seed", status="started"))
+    db.add(models.Race(name="race"))
+    db.commit()
+    db.add_all([models.Game(user_id=u, race_id=RACE_ID, multiplayer_session_id=1, score=0) for u in (1, 2, 3)])
+    db.commit()
+    db.close()
+
+def _stats() -> dict:
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("SELECT user_id, races_played, total_score, multiplayer_wins FROM user_stats")).all()
+        return {user_id: (played, total, wins) for user_id, played, total, wins in rows}
+    finally:
+        db.close()
+
+def _overlapping(first: tuple, second: tuple):
+    """Runs two submissions so the second starts while the first is still uncommitted."""
+    db = SessionLocal()
+    # submit_game_score commits; hold the first transaction open by running its statements directly
+    db.execute(scores.LOCK_RACE_GAMES_SQL, {"race_id": RACE_ID})
+    db.execute(scores.SUBMIT_SCORE_SQL, {
+        "user_id": first[0], "race_id": RACE_ID, "score": first[1],
+        "quarantined": False, "accepted_score": first[1], "reset_score": False
+    })
+
+    def submit_second():
+        other = SessionLocal()
+        try:
+            scores.submit_game_score(other, second[0], RACE_ID, second[1])
+        finally:
+            other.close()
+
+    thread = threading.Thread(target=submit_second)
+    thread.start()
+    time.sleep(0.3) # let it block on the row locks
+    db.commit()
+    db.close()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+def test_retried_submission_counts_once(race):
+    _overlapping((1, 100), (1, 100))
+    assert _stats()[1] == (1, 100, 1)
+
+def test_rivals_finishing_together_get_one_win(race):
+    _overlapping((2, 200), (3, 300))
+    stats = _stats()
+    assert stats[2] == (1, 200, 0)
+    assert stats[3] == (1, 300, 1)
+
+def test_solo_race_is_not_multiplayer(race):
+    # start_single_player runs solo races in a private session for one player
+    db = SessionLocal()
+    db.add(models.MultiplayerSession(host_id=1, max_players=1, game_seed="solo", status="started"))
+    db.add(models.Race(name="solo"))
+    db.commit()
+    db.add(models.Game(user_id=1, race_id=2, multiplayer_session_id=2, score=0))
+    db.commit()
+    scores.submit_game_score(db, 1, 2, 500)
+    row = db.execute(text("SELECT races_played, multiplayer_played, multiplayer_wins FROM user_stats WHERE user_id = 1")).one()
+    db.close()
+    assert tuple(row) == (1, 0, 0)
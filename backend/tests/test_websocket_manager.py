@@ -0,0 +1,46 @@
+import asyncio
+import json
+import time
+from libs import websocket_manager
+from libs.websocket_manager import ConnectionManager
+
+class FakeSocket:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = code
+
+def test_slow_socket_does_not_hold_up_the_lobby(monkeypatch):
+    monkeypatch.setattr(websocket_manager.settings, "WS_SEND_TIMEOUT", 0.2)
+
+    async def run():
+        manager = ConnectionManager()
+        sender, slow = FakeSocket(), FakeSocket(delay=60)
+        fast = [FakeSocket() for _ in range(20)]
+        for i, ws in enumerate([sender, slow, *fast]):
+            await manager.connect(ws, "1", i)
+
+        started = time.monotonic()
+        await manager.broadcast({"type": "move", "user_id": 0, "lane": 1}, "1", exclude=sender)
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(0.3) # let the eviction close run
+        return manager, sender, slow, fast, elapsed
+
+    manager, sender, slow, fast, elapsed = asyncio.run(run())
+    # Bounded by one send timeout, not one per recipient
+    assert elapsed < 0.5
+    assert all(ws.sent and ws.sent[0]["type"] == "move" for ws in fast)
+    assert sender.sent == []
+    assert slow not in manager.active_connections["1"]
+    assert slow.closed == 1013
+    assert len(manager.active_connections["1"]) == 21
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from libs import ws_rate_limit
+from libs.ws_rate_limit import InboundLimiter, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ws_rate_limit, "time", clock)
+    return clock
+
+@pytest.fixture
+def budgets(monkeypatch):
+    for name, value in {"WS_MOVE_RATE": 10, "WS_MOVE_BURST": 2, "WS_COLLECT_BURST": 3, "WS_DEFAULT_RATE": 1, "WS_DEFAULT_BURST": 2}.items():
+        monkeypatch.setattr(ws_rate_limit.settings, name, value)
+
+def _move(n: int) -> dict:
+    return {"type": "move", "lane": n, "distance": n}
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.time_until() == pytest.approx(0.1)
+    clock.now += 0.1
+    assert bucket.take() and not bucket.take()
+    clock.now += 60
+    assert bucket.take_up_to(10) == 3
+
+def test_moves_over_budget_are_coalesced_to_the_latest(clock, budgets):
+    limiter = InboundLimiter()
+    admitted = [limiter.admit(_move(n)) for n in range(5)]
+    assert [m["lane"] for m in admitted if m] == [0, 1]
+    assert limiter.pending_move["lane"] == 4
+    assert limiter.stats() == {"relayed": 2, "dropped": 0, "coalesced": 2, "capped": 0}
+    # Later moves queue behind the pending one rather than overtaking it
+    clock.now += 1
+    assert limiter.admit(_move(5)) is None
+    assert limiter.pending_move["lane"] == 5
+
+def test_flush_relays_only_the_latest_move_once(budgets):
+    async def run():
+        limiter = InboundLimiter()
+        relayed = []
+
+        async def relay(message):
+            relayed.append(message["lane"])
+
+        for n in range(6):
+            if limiter.admit(_move(n)) is None:
+                # The endpoint calls this for every deferred frame; only one flusher may run
+                limiter.schedule_flush(relay)
+        flusher = limiter._flush_task
+        await asyncio.wait_for(flusher, 1)
+        return limiter, relayed
+
+    limiter, relayed = asyncio.run(run())
+    assert relayed == [5]
+    assert limiter.pending_move is None and limiter._flush_task is None
+    assert limiter.stats()["relayed"] == 3
+
+def test_collect_amount_is_capped_by_the_spawn_budget(clock, budgets):
+    limiter = InboundLimiter()
+    assert limiter.admit({"type": "collect", "amount": 10})["amount"] == 3
+    assert limiter.admit({"type": "collect", "amount": 1}) is None
+    assert limiter.stats() == {"relayed": 1, "dropped": 1, "capped": 1, "coalesced": 0}
+
+def test_collect_amount_must_be_a_positive_int(clock, budgets):
+    limiter = InboundLimiter()
+    for amount in (True, "5", 2.5, -4, None):
+        limiter.collect_bucket.tokens = 3
+        assert limiter.admit({"type": "collect", "amount": amount})["amount"] == 1
+
+def test_other_frames_share_a_budget_and_excess_is_dropped(clock, budgets):
+    limiter = InboundLimiter()
+    results = [limiter.admit({"type": t}) for t in ("nitro", "crash", "nitro")]
+    assert [r is not None for r in results] == [True, True, False]
+    assert limiter.dropped == 1
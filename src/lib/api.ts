@@ -31,6 +31,82 @@ function getAuthHeaders(): Record<string, string> {
     return token ? { 'Authorization': `Bearer ${token}` } : {};
 }
 
+// Date collections are buffered in localStorage and sent as id'd events, so a flaky
+// network (or a retry of a request that did arrive) can't lose or double count them
+interface CollectEvent {
+    id: string;
+    ts: string;
+    count: number;
+}
+
+const COLLECT_BUFFER_KEY = 'pending_collect_events';
+const COLLECT_BATCH_SIZE = 500; // COLLECT_MAX_EVENTS on the server
+
+let collectFlush: Promise<{ status: string, collected: number } | null> | null = null;
+
+function eventId(): string {
+    if (typeof crypto !== 'undefined' && crypto.randomUUID) return crypto.randomUUID();
+    // randomUUID is only available in secure contexts
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+}
+
+function readCollectBuffer(): CollectEvent[] {
+    try {
+        return JSON.parse(localStorage.getItem(COLLECT_BUFFER_KEY) || '[]');
+    } catch {
+        return [];
+    }
+}
+
+function writeCollectBuffer(events: CollectEvent[]) {
+    localStorage.setItem(COLLECT_BUFFER_KEY, JSON.stringify(events));
+}
+
+async function sendCollectEvents(): Promise<{ status: string, collected: number } | null> {
+    let result = null;
+    while (true) {
+        const batch = readCollectBuffer().slice(0, COLLECT_BATCH_SIZE);
+        if (batch.length === 0) return result;
+        // Network errors propagate and leave the batch buffered for the next flush
+        const res = await fetch(`${API_BASE}/game/challenge/collect`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                ...getAuthHeaders()
+            },
+            body: JSON.stringify({ events: batch })
+        });
+        if (!res.ok && (res.status >= 500 || res.status === 401 || res.status === 429)) {
+            throw new Error('Failed to collect date');
+        }
+        // Sent (or refused for good, e.g. the challenge window closed): drop the batch
+        const sent = new Set(batch.map((e) => e.id));
+        writeCollectBuffer(readCollectBuffer().filter((e) => !sent.has(e.id)));
+        if (!res.ok) throw new Error('Failed to collect date');
+        result = await res.json();
+    }
+}
+
+function flushCollectEvents(): Promise<{ status: string, collected: number } | null> {
+    // One flush at a time; events added meanwhile go out in its next round
+    if (!collectFlush) {
+        collectFlush = sendCollectEvents().finally(() => {
+            collectFlush = null;
+        });
+    }
+    return collectFlush;
+}
+
+if (typeof window !== 'undefined') {
+    window.addEventListener('online', () => {
+        flushCollectEvents().catch(() => {});
+    });
+    // Anything left over from a previous visit
+    if (localStorage.getItem(COLLECT_BUFFER_KEY)) {
+        flushCollectEvents().catch(() => {});
+    }
+}
+
 export const api = {
     auth: {
         async login(code: string): Promise<User> {
@@ -165,18 +241,11 @@ export const api = {
             if (!res.ok) throw new Error('Failed to get challenge status');
             return res.json();
         },
-        async collectDate(count: number = 1): Promise<{ status: string, collected: number }> {
-            const res = await fetch(`${API_BASE}/game/challenge/collect`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    ...getAuthHeaders()
-                },
-                body: JSON.stringify({ count })
-            });
-            if (!res.ok) throw new Error('Failed to collect date');
-            return res.json();
+        async collectDate(count: number = 1): Promise<{ status: string, collected: number } | null> {
+            writeCollectBuffer([...readCollectBuffer(), { id: eventId(), ts: new Date().toISOString(), count }]);
+            return flushCollectEvents();
         },
+        flushCollectEvents,
         async getChallengeLeaderboard(): Promise<{ username: string, dates: number, photo: string | null }[]> {
             const res = await fetch(`${API_BASE}/game/challenge/leaderboard`);
             if (!res.ok) throw new Error('Failed to get challenge leaderboard');